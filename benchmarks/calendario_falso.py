@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from benchmarks.datos_sinteticos import turno
+
+# Servicio de Google Calendar falso: responde a events().list(...).execute()
+# con los turnos sintéticos, paginando con nextPageToken como la API real.
+ZONA = ZoneInfo("Europe/Madrid")
+
+class _Peticion:
+    def __init__(self, servicio, parametros):
+        self._servicio = servicio
+        self._parametros = parametros
+
+    def execute(self):
+        return self._servicio.responder(self._parametros)
+
+class ServicioFalso:
+    def __init__(self, listado, latencia=0.0):
+        self.listado = listado
+        self.latencia = latencia
+        self.peticiones = 0
+        self._ultima_consulta = (None, [])
+
+    def events(self):
+        return self
+
+    def list(self, **parametros):
+        return _Peticion(self, parametros)
+
+    def _eventos(self, desde, hasta):
+        dia = desde.date()
+        while dia < hasta.date() + timedelta(days=1):
+            for trabajador in self.listado:
+                franja = turno(trabajador["id"], dia)
+                if not franja:
+                    continue
+                base = datetime(dia.year, dia.month, dia.day, tzinfo=ZONA)
+                inicio = base + timedelta(minutes=franja[0])
+                if desde <= inicio < hasta:
+                    yield {
+                        "id": f"{trabajador['id']}-{dia.isoformat()}",
+                        "summary": f"{trabajador['alias']} - Turno",
+                        "start": {"dateTime": inicio.isoformat()},
+                        "end": {"dateTime": (base + timedelta(minutes=franja[1])).isoformat()},
+                    }
+            dia += timedelta(days=1)
+
+    def responder(self, parametros):
+        self.peticiones += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        if parametros.get("syncToken"):
+            return {"items": [], "nextSyncToken": "sintetico"}
+        desde = datetime.fromisoformat(parametros["timeMin"])
+        hasta = datetime.fromisoformat(parametros["timeMax"]) if parametros.get("timeMax") else datetime.now(ZONA)
+        # Las páginas de una misma consulta se sirven de la misma lista
+        if self._ultima_consulta[0] != (desde, hasta):
+            self._ultima_consulta = ((desde, hasta), list(self._eventos(desde, hasta)))
+        eventos = self._ultima_consulta[1]
+
+        inicio = int(parametros.get("pageToken") or 0)
+        tamano = parametros.get("maxResults", 250)
+        respuesta = {"items": eventos[inicio:inicio + tamano]}
+        if inicio + tamano < len(eventos):
+            respuesta["nextPageToken"] = str(inicio + tamano)
+        else:
+            respuesta["nextSyncToken"] = "sintetico"
+        return respuesta
@@ -0,0 +1,83 @@
+import json
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+# Genera un árbol con la misma forma que el del repositorio:
+#   <raiz>/trabajadores/listado.json
+#   <raiz>/registros/preparados/AAAA-MM-DD/<id>.json
+# Los turnos son deterministas (dependen solo del trabajador y del día), así
+# que el calendario falso y el almacén sintético coinciden.
+
+def generar_listado(num_trabajadores):
+    return [
+        {
+            "id": str(i),
+            "nombre": f"Trabajador{i}",
+            "apellidos": f"Apellido{i} Sintetico",
+            "nif": f"{10000000 + i}X",
+            "alias": f"T{i}",
+            "pin": 1000 + i,
+            "activo": True
+        }
+        for i in range(1, num_trabajadores + 1)
+    ]
+
+def turno(trabajador_id, dia):
+    # (hora_inicio, hora_fin) en minutos, o None si ese día no trabaja
+    if dia.weekday() == 6:
+        return None
+    rnd = random.Random(f"{trabajador_id}-{dia.isoformat()}")
+    if rnd.random() < 0.25:
+        return None
+    inicio = rnd.choice([9 * 60, 9 * 60 + 30, 16 * 60])
+    return inicio, inicio + rnd.choice([180, 240, 300, 480, 540])
+
+def _hhmm(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def generar_registro(trabajador, dia):
+    franja = turno(trabajador["id"], dia)
+    if not franja:
+        return None
+    inicio, fin = franja
+    return {
+        "id": trabajador["id"],
+        "nombre": trabajador["nombre"],
+        "apellidos": trabajador["apellidos"],
+        "nif": trabajador["nif"],
+        "fecha": dia.isoformat(),
+        "entrada": _hhmm(inicio),
+        "salida": _hhmm(fin),
+        "estado": "trabajado",
+        "firmado_por_pin": False,
+        "pin_usado": None,
+        "timestamp_firma": None,
+        # Formato "H:MM" de los registros antiguos (lo lee registro.horas_a_float)
+        "horas": f"{(fin - inicio) // 60}:{(fin - inicio) % 60:02d}",
+    }
+
+def generar_arbol(raiz, num_trabajadores, anios, hasta=None):
+    # Devuelve (listado, número de registros escritos)
+    raiz = Path(raiz)
+    hasta = hasta or date.today()
+    desde = date(hasta.year - anios, 1, 1)
+
+    listado = generar_listado(num_trabajadores)
+    (raiz / "trabajadores").mkdir(parents=True, exist_ok=True)
+    with open(raiz / "trabajadores" / "listado.json", "w", encoding="utf-8") as f:
+        json.dump(listado, f, indent=4, ensure_ascii=False)
+
+    total = 0
+    dia = desde
+    while dia <= hasta:
+        carpeta = raiz / "registros" / "preparados" / dia.isoformat()
+        for trabajador in listado:
+            registro = generar_registro(trabajador, dia)
+            if registro:
+                carpeta.mkdir(parents=True, exist_ok=True)
+                with open(carpeta / f"{trabajador['id']}.json", "w", encoding="utf-8") as f:
+                    json.dump(registro, f, indent=4, ensure_ascii=False)
+                total += 1
+        dia += timedelta(days=1)
+    return listado, total
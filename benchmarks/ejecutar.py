@@ -0,0 +1,109 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+# Los scripts usan rutas relativas ("../registros", "../trabajadores"...),
+# así que se ejecutan desde <raiz>/scripts dentro de un árbol sintético.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from benchmarks.datos_sinteticos import generar_arbol
+from benchmarks.calendario_falso import ServicioFalso
+
+def medir(funcion, repeticiones=1):
+    # Tiempo total en segundos, con la salida por pantalla de los scripts silenciada
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            funcion()
+        return time.perf_counter() - inicio
+
+def ejecutar(num_trabajadores, anios, procesos=None, latencia=0.0, repeticiones_pin=100000):
+    import almacen_registros
+    import generar_pdf_mensual
+    import plantilla
+    import reconstruir_registros
+
+    resultados = {}
+    hoy = date.today()
+    anio_pdf = hoy.year - 1 if anios >= 1 else hoy.year
+    mes_pdf = 1 if anios >= 1 else hoy.month
+
+    listado, total = generar_arbol("..", num_trabajadores, anios, hoy)
+    resultados["datos"] = {"registros": total, "dias": sum(1 for _ in os.scandir(almacen_registros.RUTA_LEGADO))}
+
+    segundos = medir(lambda: generar_pdf_mensual.generar_pdf(listado[0]["id"], anio_pdf, mes_pdf))
+    resultados["pdf_un_trabajador_sin_migrar"] = {"segundos": segundos}
+
+    segundos = medir(almacen_registros.migrar)
+    resultados["migrar"] = {"segundos": segundos, "registros_por_segundo": total / segundos}
+
+    segundos = medir(lambda: generar_pdf_mensual.generar_pdf(listado[0]["id"], anio_pdf, mes_pdf))
+    resultados["pdf_un_trabajador"] = {"segundos": segundos}
+
+    segundos = medir(lambda: generar_pdf_mensual.generar_lote(listado, anio_pdf, range(1, 13), procesos=procesos))
+    resultados["pdf_lote_anual"] = {"segundos": segundos, "pdfs": len(listado) * 12, "procesos": procesos}
+
+    pins = [str(t["pin"]) for t in listado]
+    plantilla.por_pin(pins[0])
+    segundos = medir(lambda: [plantilla.por_pin(p) for p in pins], max(1, repeticiones_pin // len(pins)))
+    busquedas = max(1, repeticiones_pin // len(pins)) * len(pins)
+    resultados["busqueda_pin"] = {"segundos": segundos, "busquedas": busquedas, "ns_por_busqueda": segundos / busquedas * 1e9}
+
+    inicio_borrado = date(anio_pdf, mes_pdf, 1)
+    fin_borrado = date(anio_pdf, 12, 31)
+    segundos = medir(lambda: almacen_registros.borrar_rango(inicio_borrado, fin_borrado))
+    resultados["borrar_rango"] = {"segundos": segundos, "desde": inicio_borrado.isoformat(), "hasta": fin_borrado.isoformat()}
+
+    servicio = ServicioFalso(listado, latencia)
+    trabajadores_dict = plantilla.activos_por_nombre()
+    segundos = medir(lambda: reconstruir_registros.reconstruir_completo(servicio, trabajadores_dict, hoy))
+    resultados["reconstruir"] = {"segundos": segundos, "peticiones_calendario": servicio.peticiones}
+
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide las rutas críticas sobre un almacén sintético")
+    parser.add_argument("--trabajadores", type=int, default=10)
+    parser.add_argument("--anios", type=int, default=2)
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para el lote anual de PDFs")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia simulada por petición al calendario")
+    parser.add_argument("--directorio", help="Directorio de trabajo (por defecto uno temporal que se borra al terminar)")
+    parser.add_argument("--salida", help="Archivo JSON de resultados (por defecto, la salida estándar)")
+    args = parser.parse_args()
+
+    raiz = Path(args.directorio or tempfile.mkdtemp(prefix="bench_registro_")).resolve()
+    (raiz / "scripts").mkdir(parents=True, exist_ok=True)
+    directorio_original = os.getcwd()
+    os.chdir(raiz / "scripts")
+    try:
+        resultados = ejecutar(args.trabajadores, args.anios, args.procesos, args.latencia_ms / 1000)
+    finally:
+        os.chdir(directorio_original)
+        if not args.directorio:
+            shutil.rmtree(raiz, ignore_errors=True)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"trabajadores": args.trabajadores, "anios": args.anios, "procesos": args.procesos, "latencia_ms": args.latencia_ms},
+        "resultados": resultados,
+    }
+    texto = json.dumps(informe, indent=4, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+if __name__ == "__main__":
+    main()
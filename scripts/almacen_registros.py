@@ -0,0 +1,596 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+from datetime import date
+from pathlib import Path
+import diario_registros
+from registro import horas_a_float
+from instrumentacion import tramo, contar, argumento_perfil, ejecutar
+
+# Un segmento por mes: registros/mensual/AAAA-MM.jsonl
+# La primera línea es la cabecera con el índice {id_trabajador: [desplazamiento, longitud]}
+# (en bytes, contados desde el final de la cabecera); después, un registro JSON
+# compacto por línea, agrupados por trabajador y ordenados por fecha.
+# La cabecera guarda también los totales del mes por trabajador
+# {id_trabajador: {horas, extras, dias, sin_salida}}, recalculados en cada escritura.
+# Los segmentos se escriben en un temporal que se renombra encima del original,
+# y solo si su contenido ha cambiado.
+# Los años cerrados se empaquetan en registros/archivo/AAAA.zip, con un miembro
+# AAAA-MM.jsonl por mes (el directorio del zip hace de índice). Las lecturas
+# buscan primero el segmento suelto, después el archivo y por último el formato
+# antiguo; escribir en un mes archivado crea de nuevo su segmento suelto.
+# Los escritores no reescriben segmentos: anotan sus cambios en el diario
+# (diario_registros.py), que las lecturas aplican encima del segmento, y
+# compactar() los vuelca cuando el diario supera MAX_DIARIO operaciones.
+RUTA_ALMACEN = Path("../registros/mensual/")
+RUTA_LEGADO = Path("../registros/preparados/")
+RUTA_ARCHIVO = Path("../registros/archivo/")
+HORAS_JORNADA = 8
+RETENCION_ANIOS = 4
+MAX_DIARIO = 500
+# Lecturas sin cerrojo antes de leer dentro de él si el diario no deja de cambiar
+REINTENTOS_LECTURA = 3
+
+def ruta_segmento(anio, mes):
+    return RUTA_ALMACEN / f"{anio}-{mes:02d}.jsonl"
+
+def _mes_de(fecha):
+    fecha = str(fecha)
+    return int(fecha[:4]), int(fecha[5:7])
+
+def calcular_totales(registros):
+    # Horas trabajadas, horas por encima de la jornada, días trabajados y días sin salida
+    horas = extras = 0.0
+    dias = sin_salida = 0
+    for r in registros:
+        if r.get("estado") != "trabajado":
+            continue
+        dias += 1
+        if r.get("entrada") and not r.get("salida"):
+            sin_salida += 1
+        try:
+            h = horas_a_float(r.get("horas"))
+        except ValueError:
+            h = 0.0  # Horas mal escritas: no suman (verificar las señala como horas_invalidas)
+        horas += h
+        extras += max(0.0, h - HORAS_JORNADA)
+    return {"horas": round(horas, 2), "extras": round(extras, 2), "dias": dias, "sin_salida": sin_salida}
+
+def _agrupar(cuerpo):
+    # Todas las líneas en una sola llamada a json.loads (el JSON compacto no lleva saltos de línea)
+    cuerpo = cuerpo.rstrip("\n")
+    por_trabajador = {}
+    for registro in json.loads("[" + cuerpo.replace("\n", ",") + "]") if cuerpo else []:
+        por_trabajador.setdefault(str(registro["id"]), []).append(registro)
+    return por_trabajador
+
+def _leer_segmento(ruta):
+    if not ruta.exists():
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        f.readline()
+        return _agrupar(f.read())
+
+def ruta_archivo(anio):
+    return RUTA_ARCHIVO / f"{anio}.zip"
+
+def _segmento_archivado(anio, mes):
+    # Contenido del segmento del mes dentro del archivo del año, o None
+    ruta = ruta_archivo(anio)
+    if not ruta.exists():
+        return None
+    with zipfile.ZipFile(ruta) as archivo:
+        try:
+            return archivo.read(f"{anio}-{mes:02d}.jsonl")
+        except KeyError:
+            return None
+
+def _huella(contenido):
+    return hashlib.blake2b(contenido, digest_size=16).digest()
+
+def _sin_cambios(ruta, contenido):
+    # Solo se lee el segmento actual cuando coincide el tamaño
+    try:
+        if os.stat(ruta).st_size != len(contenido):
+            return False
+        with open(ruta, "rb") as f:
+            return _huella(f.read()) == _huella(contenido)
+    except FileNotFoundError:
+        return False
+
+def _sincronizar_directorio(carpeta):
+    # Hace duraderos los renombrados del lote (no disponible en Windows)
+    if os.name == "nt":
+        return
+    descriptor = os.open(carpeta, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+def _hay_respaldo(prefijo):
+    # Un mes vaciado que aún está en el archivo o en carpetas antiguas se guarda como
+    # segmento vacío; si se borrara, cargar_mes volvería a leer los registros de allí
+    anio, mes = _mes_de(prefijo)
+    if ruta_archivo(anio).exists():
+        with zipfile.ZipFile(ruta_archivo(anio)) as archivo:
+            if f"{prefijo}.jsonl" in archivo.namelist():
+                return True
+    return RUTA_LEGADO.exists() and any(
+        e.name.startswith(prefijo) for e in os.scandir(RUTA_LEGADO)
+    )
+
+def _escribir_segmento(ruta, por_trabajador):
+    # Devuelve True si ha cambiado algo en disco
+    if not any(por_trabajador.values()) and not _hay_respaldo(ruta.stem):
+        if ruta.exists():
+            ruta.unlink()
+            return True
+        return False
+
+    contenido = _serializar(por_trabajador, ruta.name)
+    if _sin_cambios(ruta, contenido):
+        contar("almacen.segmentos_sin_cambios")
+        return False
+
+    with tramo("almacen.escribir", segmento=ruta.name, bytes=len(contenido)):
+        RUTA_ALMACEN.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_suffix(".tmp")
+        with open(temporal, "wb") as f:
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    contar("almacen.segmentos_escritos")
+    return True
+
+def _serializar(por_trabajador, nombre):
+    # Cabecera con índice y totales seguida de los bloques de cada trabajador
+    indice = {}
+    totales = {}
+    cuerpo = []
+    desplazamiento = 0
+    with tramo("almacen.serializar", segmento=nombre):
+        for trabajador_id in sorted(por_trabajador, key=str):
+            registros = sorted(por_trabajador[trabajador_id], key=lambda r: r["fecha"])
+            if not registros:
+                continue
+            bloque = b"".join(
+                json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                for r in registros
+            )
+            indice[str(trabajador_id)] = [desplazamiento, len(bloque)]
+            totales[str(trabajador_id)] = calcular_totales(registros)
+            desplazamiento += len(bloque)
+            cuerpo.append(bloque)
+
+    return json.dumps({"indice": indice, "totales": totales}, separators=(",", ":")).encode("utf-8") + b"\n" + b"".join(cuerpo)
+
+def _registros_legado(prefijo=""):
+    # Una sola pasada con os.scandir por las carpetas AAAA-MM-DD que empiezan por prefijo
+    if not RUTA_LEGADO.exists():
+        return
+    for carpeta in sorted(os.scandir(RUTA_LEGADO), key=lambda e: e.name):
+        if not carpeta.name.startswith(prefijo) or not carpeta.is_dir():
+            continue
+        for archivo in os.scandir(carpeta.path):
+            if archivo.name.endswith(".json"):
+                with open(archivo.path, encoding="utf-8") as f:
+                    yield json.load(f)
+
+def _con_diario(anio, mes, leer):
+    # (leer(), operaciones del diario del mes) como si se hubieran leído a la vez.
+    # Si el diario cambia mientras se lee el segmento (otra anotación seguida de
+    # una compactación) se aplicaría solo una parte de sus operaciones sobre un
+    # segmento que ya las incluye todas, y ganaría la más antigua: se repite la
+    # lectura y, si el diario no para de cambiar, se hace dentro del cerrojo
+    for _ in range(REINTENTOS_LECTURA):
+        firma, operaciones = diario_registros.instantanea(anio, mes)
+        datos = leer()
+        if diario_registros.firma() == firma:
+            return datos, operaciones
+    with diario_registros.cerrojo():
+        return leer(), diario_registros.del_mes(anio, mes)
+
+def cargar_mes(anio, mes):
+    # Todos los registros del mes en una sola lectura: {id_trabajador: [registros]}
+    por_trabajador, operaciones = _con_diario(anio, mes, lambda: _cargar_segmento(anio, mes))
+    if operaciones:
+        diario_registros.aplicar(por_trabajador, operaciones)
+    return por_trabajador
+
+def _cargar_segmento(anio, mes, legado=True):
+    # Lo guardado en el segmento, el archivo o (con legado) el formato antiguo, sin el diario
+    ruta = ruta_segmento(anio, mes)
+    with tramo("almacen.cargar_mes", mes=f"{anio}-{mes:02d}") as t:
+        archivado = None if ruta.exists() else _segmento_archivado(anio, mes)
+        if ruta.exists():
+            por_trabajador = _leer_segmento(ruta)
+        elif archivado is not None:
+            t["archivado"] = True
+            por_trabajador = _agrupar(archivado.decode("utf-8").split("\n", 1)[1])
+        else:
+            # Mes aún sin migrar al almacén mensual
+            t["legado"] = legado
+            por_trabajador = {}
+            for registro in _registros_legado(f"{anio}-{mes:02d}-") if legado else []:
+                por_trabajador.setdefault(str(registro["id"]), []).append(registro)
+        t["registros"] = sum(len(r) for r in por_trabajador.values())
+    return por_trabajador
+
+def leer_registros(trabajador_id, anio, mes):
+    registros, operaciones = _con_diario(anio, mes, lambda: _leer_bloque(trabajador_id, anio, mes))
+    if operaciones:
+        por_trabajador = {str(trabajador_id): registros}
+        diario_registros.aplicar(por_trabajador, operaciones, trabajador_id)
+        registros = por_trabajador[str(trabajador_id)]
+    return registros
+
+def _leer_bloque(trabajador_id, anio, mes):
+    # Solo lee el bloque del trabajador gracias al índice de la cabecera
+    ruta = ruta_segmento(anio, mes)
+    if not ruta.exists():
+        archivado = _segmento_archivado(anio, mes)
+        if archivado is None:
+            return _cargar_segmento(anio, mes).get(str(trabajador_id), [])
+        cabecera, cuerpo = archivado.split(b"\n", 1)
+        posicion = json.loads(cabecera)["indice"].get(str(trabajador_id))
+        if not posicion:
+            return []
+        bloque = cuerpo[posicion[0]:posicion[0] + posicion[1]]
+        return [json.loads(linea) for linea in bloque.splitlines()]
+    with open(ruta, "rb") as f:
+        indice = json.loads(f.readline())["indice"]
+        posicion = indice.get(str(trabajador_id))
+        if not posicion:
+            return []
+        f.seek(f.tell() + posicion[0])
+        bloque = f.read(posicion[1])
+    return [json.loads(linea) for linea in bloque.splitlines()]
+
+def totales_del_mes(anio, mes):
+    # {id_trabajador: totales} leyendo solo la cabecera del segmento
+    if diario_registros.del_mes(anio, mes):
+        return {i: calcular_totales(r) for i, r in cargar_mes(anio, mes).items() if r}
+    ruta = ruta_segmento(anio, mes)
+    archivado = None if ruta.exists() else _segmento_archivado(anio, mes)
+    if ruta.exists():
+        with open(ruta, "rb") as f:
+            cabecera = json.loads(f.readline())
+        if "totales" in cabecera:
+            return cabecera["totales"]
+    elif archivado is not None:
+        return json.loads(archivado.split(b"\n", 1)[0])["totales"]
+    # Mes sin migrar o segmento escrito antes de guardar los totales
+    return {i: calcular_totales(r) for i, r in cargar_mes(anio, mes).items() if r}
+
+def totales_mes(trabajador_id, anio, mes):
+    return totales_del_mes(anio, mes).get(str(trabajador_id), calcular_totales([]))
+
+def leer_registro(fecha, trabajador_id):
+    anio, mes = _mes_de(fecha)
+    return next((r for r in leer_registros(trabajador_id, anio, mes) if r["fecha"] == str(fecha)), None)
+
+def _linea(registro):
+    return json.dumps(registro, ensure_ascii=False, sort_keys=True)
+
+def _instantanea(por_trabajador):
+    # ({(id, fecha): línea JSON}, días duplicados) de un mes tal como se ha leído
+    lineas, duplicados = {}, set()
+    for lista in por_trabajador.values():
+        for r in lista:
+            clave = (str(r["id"]), r["fecha"])
+            if clave in lineas:
+                duplicados.add(clave)
+            lineas[clave] = _linea(r)
+    return lineas, duplicados
+
+class EscritorRegistros:
+    # Acumula en memoria los cambios de un lote (un día, una ejecución completa...)
+    # y al confirmar anota en el diario solo los registros que han cambiado
+    # respecto a lo leído, con un único fsync por lote. Usado como contexto
+    # confirma al salir sin error:
+    #   with EscritorRegistros(conservar_firmados=True) as escritor:
+    #       escritor.guardar(registro)
+    # Con conservar_firmados la comprobación se repite al compactar, así que un
+    # fichaje anotado mientras el lote estaba abierto tampoco se sustituye.
+    def __init__(self, conservar_firmados=False):
+        self.conservar_firmados = conservar_firmados
+        self._meses = {}
+        self._leidos = {}
+        self._pendientes = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.confirmar()
+
+    def _mes(self, anio, mes):
+        if (anio, mes) not in self._meses:
+            self._meses[(anio, mes)] = cargar_mes(anio, mes)
+            self._leidos[(anio, mes)] = _instantanea(self._meses[(anio, mes)])
+        return self._meses[(anio, mes)]
+
+    def leer(self, fecha, trabajador_id):
+        # Incluye lo pendiente de confirmar en este lote
+        lista = self._mes(*_mes_de(fecha)).get(str(trabajador_id), [])
+        return next((r for r in lista if r["fecha"] == str(fecha)), None)
+
+    def guardar(self, registro):
+        # Devuelve False si se ha conservado un registro firmado con PIN
+        anio, mes = _mes_de(registro["fecha"])
+        lista = self._mes(anio, mes).setdefault(str(registro["id"]), [])
+        if self.conservar_firmados and any(r["fecha"] == registro["fecha"] and r.get("firmado_por_pin") for r in lista):
+            return False
+        lista[:] = [r for r in lista if r["fecha"] != registro["fecha"]]
+        lista.append(registro)
+        self._pendientes.add((anio, mes))
+        contar("almacen.registros_guardados")
+        return True
+
+    def guardar_varios(self, registros):
+        for registro in registros:
+            self.guardar(registro)
+
+    def reemplazar_mes(self, anio, mes, por_trabajador):
+        # Sustituye todos los registros del mes (para reparaciones que reescriben el mes entero)
+        self._mes(anio, mes)
+        self._meses[(anio, mes)] = por_trabajador
+        self._pendientes.add((anio, mes))
+
+    def borrar(self, fecha, trabajador_id):
+        anio, mes = _mes_de(fecha)
+        por_trabajador = self._mes(anio, mes)
+        lista = por_trabajador.get(str(trabajador_id), [])
+        restantes = [r for r in lista if r["fecha"] != str(fecha)]
+        if len(restantes) == len(lista):
+            return False
+        por_trabajador[str(trabajador_id)] = restantes
+        self._pendientes.add((anio, mes))
+        return True
+
+    def borrar_rango(self, inicio, fin):
+        # Devuelve los días que tenían registros
+        inicio, fin = str(inicio), str(fin)
+        dias_borrados = set()
+        anio, mes = _mes_de(inicio)
+        while (anio, mes) <= _mes_de(fin):
+            for trabajador_id, lista in self._mes(anio, mes).items():
+                restantes = [r for r in lista if not inicio <= r["fecha"] <= fin]
+                if len(restantes) != len(lista):
+                    dias_borrados.update(r["fecha"] for r in lista if inicio <= r["fecha"] <= fin)
+                    lista[:] = restantes
+                    self._pendientes.add((anio, mes))
+            anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+        return dias_borrados
+
+    def _operaciones(self, anio, mes):
+        # Diferencia entre el mes en memoria y como se leyó, en operaciones del diario
+        leidas, duplicados = self._leidos[(anio, mes)]
+        actuales = {(str(r["id"]), r["fecha"]): r for lista in self._meses[(anio, mes)].values() for r in lista}
+        operaciones = []
+        for clave, registro in sorted(actuales.items()):
+            # Un día duplicado se reescribe siempre para que quede un solo registro
+            if leidas.get(clave) != _linea(registro) or clave in duplicados:
+                operaciones.append({"op": "guardar", "registro": registro})
+        operaciones.extend({"op": "borrar", "fecha": f, "id": i} for i, f in sorted(leidas) if (i, f) not in actuales)
+        if self.conservar_firmados:
+            for operacion in operaciones:
+                operacion["conservar_firmados"] = True
+        return operaciones
+
+    def confirmar(self):
+        # Devuelve el número de operaciones anotadas en el diario
+        operaciones = []
+        with tramo("almacen.confirmar", meses=len(self._pendientes)) as t:
+            for anio, mes in sorted(self._pendientes):
+                operaciones.extend(self._operaciones(anio, mes))
+            diario_registros.anotar(operaciones)
+            t["operaciones"] = len(operaciones)
+            if diario_registros.pendientes() > MAX_DIARIO:
+                compactar()
+        self._pendientes.clear()
+        self._meses.clear()
+        self._leidos.clear()
+        return len(operaciones)
+
+def guardar_registros(registros, conservar_firmados=False):
+    # Un solo lote: una escritura en el diario para todos los registros.
+    # Con conservar_firmados no se sustituye un registro firmado con PIN.
+    with EscritorRegistros(conservar_firmados) as escritor:
+        escritor.guardar_varios(registros)
+
+def guardar_registro(registro):
+    guardar_registros([registro])
+
+def borrar_registro(fecha, trabajador_id):
+    with EscritorRegistros() as escritor:
+        return escritor.borrar(fecha, trabajador_id)
+
+def borrar_rango(inicio, fin):
+    # Devuelve el número de días que tenían registros
+    with EscritorRegistros() as escritor:
+        return len(escritor.borrar_rango(inicio, fin))
+
+def migrar(borrar_origen=False):
+    # Migración única desde registros/preparados/AAAA-MM-DD/<id>.json
+    if not RUTA_LEGADO.exists():
+        print("⚠️ No hay registros en el formato antiguo.")
+        return
+
+    por_mes = {}
+    for registro in _registros_legado():
+        por_mes.setdefault(_mes_de(registro["fecha"]), []).append(registro)
+
+    # Los segmentos se escriben directamente: el escritor lee los meses sin segmento
+    # del formato antiguo, así que no vería diferencias y no escribiría nada
+    total = 0
+    with diario_registros.cerrojo():
+        compactar()
+        for (anio, mes), registros in sorted(por_mes.items()):
+            # Lo que ya estuviera en el segmento o el archivo es más reciente que el formato antiguo
+            por_trabajador = _cargar_segmento(anio, mes, legado=False)
+            existentes = {(str(r["id"]), r["fecha"]) for lista in por_trabajador.values() for r in lista}
+            for r in registros:
+                if (str(r["id"]), r["fecha"]) not in existentes:
+                    por_trabajador.setdefault(str(r["id"]), []).append(r)
+            _escribir_segmento(ruta_segmento(anio, mes), por_trabajador)
+            total += len(registros)
+        if RUTA_ALMACEN.exists():
+            _sincronizar_directorio(RUTA_ALMACEN)
+
+    print(f"✅ Migrados {total} registros a {len(por_mes)} segmentos mensuales.")
+    if borrar_origen:
+        shutil.rmtree(RUTA_LEGADO)
+        print(f"🗑️  Eliminada la carpeta {RUTA_LEGADO}")
+
+def compactar():
+    # Vuelca las operaciones del diario a los segmentos y empieza un diario nuevo.
+    # Devuelve el número de segmentos reescritos
+    with diario_registros.cerrojo(), tramo("almacen.compactar") as t:
+        meses = diario_registros.meses()
+        escritos = 0
+        for anio, mes in meses:
+            por_trabajador = _cargar_segmento(anio, mes)
+            diario_registros.aplicar(por_trabajador, diario_registros.del_mes(anio, mes))
+            escritos += _escribir_segmento(ruta_segmento(anio, mes), por_trabajador)
+        if escritos and RUTA_ALMACEN.exists():
+            _sincronizar_directorio(RUTA_ALMACEN)
+        if meses:
+            # Los segmentos ya son duraderos: el diario se puede vaciar
+            diario_registros.nuevo()
+        t.update(meses=len(meses), escritos=escritos)
+    return escritos
+
+def recalcular_totales():
+    # Reescribe los segmentos guardados antes de que la cabecera llevara los totales
+    reescritos = 0
+    with diario_registros.cerrojo():
+        compactar()
+        for ruta in sorted(RUTA_ALMACEN.glob("*.jsonl")):
+            reescritos += _escribir_segmento(ruta, _leer_segmento(ruta))
+    if reescritos:
+        _sincronizar_directorio(RUTA_ALMACEN)
+    print(f"✅ Totales recalculados en {reescritos} segmentos.")
+
+def meses_guardados():
+    # [(anio, mes)] con datos sueltos, archivados o en el formato antiguo
+    meses = set()
+    if RUTA_ALMACEN.exists():
+        meses.update(_mes_de(e.name) for e in os.scandir(RUTA_ALMACEN) if e.name.endswith(".jsonl"))
+    if RUTA_ARCHIVO.exists():
+        for e in os.scandir(RUTA_ARCHIVO):
+            if e.name.endswith(".zip"):
+                with zipfile.ZipFile(e.path) as archivo:
+                    meses.update(_mes_de(n) for n in archivo.namelist() if n.endswith(".jsonl"))
+    if RUTA_LEGADO.exists():
+        meses.update(_mes_de(e.name) for e in os.scandir(RUTA_LEGADO) if e.is_dir() and e.name[:4].isdigit())
+    meses.update(diario_registros.meses())
+    return sorted(meses)
+
+def _anios_guardados():
+    # Años con datos en cualquiera de los tres sitios
+    anios = set()
+    if RUTA_ALMACEN.exists():
+        anios.update(int(e.name[:4]) for e in os.scandir(RUTA_ALMACEN) if e.name.endswith(".jsonl"))
+    if RUTA_ARCHIVO.exists():
+        anios.update(int(e.name[:4]) for e in os.scandir(RUTA_ARCHIVO) if e.name.endswith(".zip"))
+    if RUTA_LEGADO.exists():
+        anios.update(int(e.name[:4]) for e in os.scandir(RUTA_LEGADO) if e.is_dir() and e.name[:4].isdigit())
+    anios.update(anio for anio, _ in diario_registros.meses())
+    return sorted(anios)
+
+def _borrar_sueltos(anio):
+    # Segmentos sueltos y carpetas antiguas del año
+    for mes in range(1, 13):
+        ruta_segmento(anio, mes).unlink(missing_ok=True)
+    if RUTA_LEGADO.exists():
+        for carpeta in os.scandir(RUTA_LEGADO):
+            if carpeta.is_dir() and carpeta.name.startswith(f"{anio}-"):
+                shutil.rmtree(carpeta.path)
+
+def archivar(anio):
+    # Empaqueta un año cerrado en registros/archivo/AAAA.zip con lo que haya suelto,
+    # en el archivo anterior o en el formato antiguo, y borra los originales
+    if anio >= date.today().year:
+        print(f"⚠️ {anio} no es un año cerrado.")
+        return False
+    with diario_registros.cerrojo(), tramo("almacen.archivar", anio=anio) as t:
+        # Lo pendiente del diario pasa antes a los segmentos que se van a empaquetar
+        compactar()
+        miembros = {}
+        for mes in range(1, 13):
+            por_trabajador = cargar_mes(anio, mes)
+            if any(por_trabajador.values()):
+                miembros[f"{anio}-{mes:02d}.jsonl"] = _serializar(por_trabajador, f"{anio}-{mes:02d}.jsonl")
+        if not miembros:
+            print(f"⚠️ No hay registros de {anio}.")
+            return False
+
+        RUTA_ARCHIVO.mkdir(parents=True, exist_ok=True)
+        destino = ruta_archivo(anio)
+        temporal = destino.with_suffix(".tmp")
+        with open(temporal, "wb") as f:
+            with zipfile.ZipFile(f, "w", compression=zipfile.ZIP_DEFLATED) as archivo:
+                for nombre, contenido in miembros.items():
+                    archivo.writestr(nombre, contenido)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, destino)
+        _sincronizar_directorio(RUTA_ARCHIVO)
+        _borrar_sueltos(anio)
+        t["meses"] = len(miembros)
+    print(f"📦 {anio} archivado en {destino} ({len(miembros)} meses).")
+    return True
+
+def archivar_cerrados():
+    for anio in _anios_guardados():
+        if anio < date.today().year:
+            archivar(anio)
+
+def purgar(retencion=RETENCION_ANIOS, hoy=None):
+    # Elimina todo lo de los años que ya han cumplido el plazo de conservación
+    hoy = hoy or date.today()
+    with diario_registros.cerrojo():
+        # Sin compactar, las operaciones del diario devolverían registros de los años purgados
+        compactar()
+        purgados = [anio for anio in _anios_guardados() if anio < hoy.year - retencion]
+        for anio in purgados:
+            ruta_archivo(anio).unlink(missing_ok=True)
+            _borrar_sueltos(anio)
+            print(f"🗑️  Eliminados los registros de {anio}.")
+    if not purgados:
+        print(f"✅ No hay registros de más de {retencion} años.")
+    return purgados
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrar", action="store_true", help="Convertir registros/preparados al almacén mensual")
+    parser.add_argument("--borrar-origen", action="store_true", help="Eliminar registros/preparados tras migrar")
+    parser.add_argument("--compactar", action="store_true", help="Volcar el diario de cambios a los segmentos")
+    parser.add_argument("--recalcular-totales", action="store_true", help="Añadir los totales mensuales a los segmentos antiguos")
+    parser.add_argument("--archivar", action="store_true", help="Empaquetar los años cerrados en registros/archivo")
+    parser.add_argument("--anio", type=int, help="Con --archivar, solo este año")
+    parser.add_argument("--purgar", action="store_true", help="Eliminar los años fuera del plazo de conservación")
+    parser.add_argument("--retencion", type=int, default=RETENCION_ANIOS, help="Años completos que se conservan")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    if args.migrar:
+        ejecutar(migrar, args.profile, borrar_origen=args.borrar_origen)
+    elif args.compactar:
+        print(f"✅ {ejecutar(compactar, args.profile)} segmentos actualizados desde el diario.")
+    elif args.recalcular_totales:
+        ejecutar(recalcular_totales, args.profile)
+    elif args.archivar and args.anio:
+        ejecutar(archivar, args.profile, args.anio)
+    elif args.archivar:
+        ejecutar(archivar_cerrados, args.profile)
+    elif args.purgar:
+        ejecutar(purgar, args.profile, args.retencion)
+    else:
+        parser.print_help()
@@ -0,0 +1,158 @@
+from datetime import date
+import numpy as np
+from almacen_registros import cargar_mes, HORAS_JORNADA
+from registro import minutos, horas_a_float
+from plantilla import por_id
+from instrumentacion import tramo, argumento_perfil, ejecutar
+
+# Comprobaciones anuales de jornada sobre todo el almacén, con NumPy.
+# Los registros se cargan una vez en arrays paralelos (un elemento por día
+# trabajado) y todas las comprobaciones son operaciones vectorizadas:
+#   - semanas (lunes a domingo) por encima de MAX_HORAS_SEMANA
+#   - descansos entre el fin de un turno y el inicio del siguiente menores de DESCANSO_MINIMO
+#   - días por encima de MAX_HORAS_DIA
+#   - horas extra (por encima de HORAS_JORNADA al día) por año y si superan MAX_EXTRAS_ANIO
+MAX_HORAS_SEMANA = 40
+DESCANSO_MINIMO = 12  # horas
+MAX_HORAS_DIA = 9
+MAX_EXTRAS_ANIO = 80
+
+_cache_horas = {"": np.nan, None: np.nan}
+
+def _horas(horas):
+    # Los mismos valores se repiten miles de veces: se convierten una sola vez
+    if horas not in _cache_horas:
+        _cache_horas[horas] = horas_a_float(horas)
+    return _cache_horas[horas]
+
+def cargar_arrays(anio_inicio, anio_fin):
+    # Devuelve (ids, datos) donde ids[i] es el id del trabajador con índice i y
+    # datos es un dict de arrays: trabajador, dia (ordinal), anio, entrada y
+    # salida (minutos desde las 00:00, -1 si falta) y horas
+    indices = {}
+    trabajador, dia, anio, entrada, salida, horas = [], [], [], [], [], []
+    with tramo("analisis.cargar", desde=anio_inicio, hasta=anio_fin) as t:
+        for a in range(anio_inicio, anio_fin + 1):
+            for mes in range(1, 13):
+                # Ordinal del día 0 del mes: el del registro es base + día
+                base = date(a, mes, 1).toordinal() - 1
+                for trabajador_id, registros in cargar_mes(a, mes).items():
+                    i = indices.setdefault(str(trabajador_id), len(indices))
+                    registros = [r for r in registros if r.get("estado") == "trabajado"]
+                    trabajador.extend([i] * len(registros))
+                    dia.extend([base + int(r["fecha"][8:10]) for r in registros])
+                    anio.extend([a] * len(registros))
+                    entrada.extend([minutos(r.get("entrada"), -1) for r in registros])
+                    salida.extend([minutos(r.get("salida"), -1) for r in registros])
+                    horas.extend([_horas(r.get("horas")) for r in registros])
+        datos = {
+            "trabajador": np.array(trabajador, dtype=np.int32),
+            "dia": np.array(dia, dtype=np.int32),
+            "anio": np.array(anio, dtype=np.int32),
+            "entrada": np.array(entrada, dtype=np.int32),
+            "salida": np.array(salida, dtype=np.int32),
+            "horas": np.array(horas, dtype=np.float64),
+        }
+        t["registros"] = len(trabajador)
+
+    # Turnos que terminan pasada la medianoche (salida "01:00" tras entrada "16:00")
+    completos = (datos["entrada"] >= 0) & (datos["salida"] >= 0)
+    datos["salida"][completos & (datos["salida"] < datos["entrada"])] += 24 * 60
+    # Sin campo horas se calculan a partir de entrada y salida
+    sin_horas = np.isnan(datos["horas"])
+    datos["horas"][sin_horas & completos] = (datos["salida"] - datos["entrada"])[sin_horas & completos] / 60
+    datos["horas"][np.isnan(datos["horas"])] = 0.0
+    return list(indices), datos
+
+def analizar(ids, datos):
+    # Un resultado por (trabajador, año)
+    with tramo("analisis.calcular", registros=len(datos["dia"])):
+        n = len(ids)
+        anios = np.unique(datos["anio"])
+        if n == 0 or len(anios) == 0:
+            return []
+        base = anios[0]
+        n_anios = int(anios[-1] - base + 1)
+        grupo = datos["trabajador"] * n_anios + (datos["anio"] - base)
+        tam = n * n_anios
+
+        horas = datos["horas"]
+        dias = np.bincount(grupo, minlength=tam)
+        total = np.bincount(grupo, weights=horas, minlength=tam)
+        extras = np.bincount(grupo, weights=np.maximum(horas - HORAS_JORNADA, 0), minlength=tam)
+        dias_largos = np.bincount(grupo, weights=horas > MAX_HORAS_DIA, minlength=tam)
+        sin_salida = np.bincount(grupo, weights=(datos["entrada"] >= 0) & (datos["salida"] < 0), minlength=tam)
+
+        # Semanas de lunes a domingo: el ordinal 1 (01/01/0001) es lunes.
+        # La semana se asigna al año del registro, así una semana partida cuenta en los dos
+        semana = (datos["dia"] - 1) // 7
+        semana_rel = semana - semana.min()
+        n_semanas = int(semana_rel.max()) + 1
+        clave = grupo.astype(np.int64) * n_semanas + semana_rel
+        claves, horas_semana = np.unique(clave, return_inverse=True)
+        horas_semana = np.bincount(horas_semana, weights=horas)
+        excedidas = claves[horas_semana > MAX_HORAS_SEMANA] // n_semanas
+        semanas_excedidas = np.bincount(excedidas, minlength=tam)
+        max_semana = np.zeros(tam)
+        np.maximum.at(max_semana, claves // n_semanas, horas_semana)
+
+        # Descanso entre turnos consecutivos del mismo trabajador
+        completos = np.flatnonzero((datos["entrada"] >= 0) & (datos["salida"] >= 0))
+        orden = completos[np.lexsort((datos["entrada"][completos], datos["dia"][completos], datos["trabajador"][completos]))]
+        inicio = datos["dia"][orden].astype(np.int64) * 1440 + datos["entrada"][orden]
+        fin = datos["dia"][orden].astype(np.int64) * 1440 + datos["salida"][orden]
+        descanso = inicio[1:] - fin[:-1]
+        mismo = datos["trabajador"][orden][1:] == datos["trabajador"][orden][:-1]
+        cortos = mismo & (descanso < DESCANSO_MINIMO * 60)
+        descansos_cortos = np.bincount(grupo[orden][1:][cortos], minlength=tam)
+        min_descanso = np.full(tam, np.inf)
+        np.minimum.at(min_descanso, grupo[orden][1:][mismo], descanso[mismo] / 60)
+
+    informe = []
+    for g in np.flatnonzero(dias):
+        informe.append({
+            "trabajador": ids[g // n_anios],
+            "anio": int(base + g % n_anios),
+            "dias": int(dias[g]),
+            "horas": round(float(total[g]), 2),
+            "extras": round(float(extras[g]), 2),
+            "extras_excedidas": bool(extras[g] > MAX_EXTRAS_ANIO),
+            "semanas_excedidas": int(semanas_excedidas[g]),
+            "max_horas_semana": round(float(max_semana[g]), 2),
+            "descansos_cortos": int(descansos_cortos[g]),
+            "min_descanso": round(float(min_descanso[g]), 2) if np.isfinite(min_descanso[g]) else None,
+            "dias_largos": int(dias_largos[g]),
+            "sin_salida": int(sin_salida[g]),
+        })
+    return informe
+
+def informe_cumplimiento(anio_inicio, anio_fin=None):
+    ids, datos = cargar_arrays(anio_inicio, anio_fin or anio_inicio)
+    return analizar(ids, datos)
+
+def imprimir(informe):
+    if not informe:
+        print("⚠️ No hay registros para el periodo indicado.")
+        return
+    print(f"{'Año':<5} {'Trabajador':<28} {'Horas':>8} {'Extra':>7} {'Sem>40':>7} {'Desc<12':>8} {'Días>9':>7} {'Sin sal.':>8}")
+    for f in sorted(informe, key=lambda f: (f["anio"], f["trabajador"])):
+        trabajador = por_id(f["trabajador"])
+        nombre = f"{trabajador['nombre']} {trabajador['apellidos']}" if trabajador else f"ID {f['trabajador']}"
+        aviso = "" if not (f["extras_excedidas"] or f["semanas_excedidas"] or f["descansos_cortos"]) else " ⚠️"
+        print(f"{f['anio']:<5} {nombre[:28]:<28} {f['horas']:>8.2f} {f['extras']:>7.2f} {f['semanas_excedidas']:>7} "
+              f"{f['descansos_cortos']:>8} {f['dias_largos']:>7} {f['sin_salida']:>8}{aviso}")
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--anio", type=int, required=True, help="Año (o primer año del periodo)")
+    parser.add_argument("--hasta", type=int, help="Último año del periodo")
+    parser.add_argument("--json", action="store_true", help="Imprimir el informe en JSON")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    informe = ejecutar(informe_cumplimiento, args.profile, args.anio, args.hasta)
+    if args.json:
+        print(json.dumps(informe, ensure_ascii=False, indent=2))
+    else:
+        imprimir(informe)
@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import leer_calendario
+
+# Caché en disco de los eventos del calendario, por (calendario, fecha).
+# Lo guardado caduca a los pocos minutos, salvo si se guardó cuando el día ya
+# tenía DIAS_PERMANENTES de antigüedad: esos días casi nunca cambian y no
+# caducan (el modo incremental de reconstruir_registros los invalida cuando el
+# calendario avisa de cambios).
+# Con offline=True nunca se consulta la API: solo se devuelve lo guardado.
+RUTA_CACHE = Path("../cache/calendario.sqlite")
+TTL_RECIENTES = 15 * 60
+DIAS_PERMANENTES = 7
+MAX_ENTRADAS = 20000
+
+def _calendario(calendario=None):
+    return calendario or leer_calendario.CALENDAR_ID or ""
+
+def _conectar():
+    RUTA_CACHE.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(RUTA_CACHE)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS eventos ("
+        " calendario TEXT, fecha TEXT, datos TEXT, guardado REAL, usado REAL,"
+        " PRIMARY KEY (calendario, fecha))"
+    )
+    return con
+
+def _vigente(fecha, guardado, ahora):
+    # Un día guardado mientras aún era reciente puede haber cambiado después: se
+    # compara cuándo se guardó, no la antigüedad que tiene hoy
+    permanente_desde = datetime.fromisoformat(fecha) + timedelta(days=1 + DIAS_PERMANENTES)
+    if guardado >= permanente_desde.timestamp():
+        return True
+    return ahora - guardado < TTL_RECIENTES
+
+def leer(fechas, offline=False, calendario=None):
+    # {fecha: eventos} con las fechas que están en la caché y siguen vigentes
+    ahora = time.time()
+    encontrados = {}
+    with closing(_conectar()) as con, con:
+        for fecha in fechas:
+            fila = con.execute(
+                "SELECT datos, guardado FROM eventos WHERE calendario = ? AND fecha = ?",
+                (_calendario(calendario), fecha)
+            ).fetchone()
+            if fila and (offline or _vigente(fecha, fila[1], ahora)):
+                encontrados[fecha] = json.loads(fila[0])
+        if encontrados:
+            con.executemany(
+                "UPDATE eventos SET usado = ? WHERE calendario = ? AND fecha = ?",
+                [(ahora, _calendario(calendario), f) for f in encontrados]
+            )
+    return encontrados
+
+def guardar(eventos_por_dia, calendario=None):
+    ahora = time.time()
+    with closing(_conectar()) as con, con:
+        con.executemany(
+            "INSERT OR REPLACE INTO eventos VALUES (?, ?, ?, ?, ?)",
+            [(_calendario(calendario), f, json.dumps(e, ensure_ascii=False), ahora, ahora) for f, e in eventos_por_dia.items()]
+        )
+        # Expulsión LRU por número de entradas
+        con.execute(
+            "DELETE FROM eventos WHERE rowid IN ("
+            " SELECT rowid FROM eventos ORDER BY usado DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRADAS,)
+        )
+
+def invalidar(fechas, calendario=None):
+    with closing(_conectar()) as con, con:
+        con.executemany(
+            "DELETE FROM eventos WHERE calendario = ? AND fecha = ?",
+            [(_calendario(calendario), f) for f in fechas]
+        )
+
+def fechas_entre(fecha_inicio, fecha_fin):
+    dia = date.fromisoformat(str(fecha_inicio))
+    fin = date.fromisoformat(str(fecha_fin))
+    while dia <= fin:
+        yield dia.isoformat()
+        dia += timedelta(days=1)
+
+def obtener_eventos_del_dia(servicio, fecha=None, offline=False, calendario=None):
+    if fecha is None:
+        fecha = date.today().isoformat()
+    encontrados = leer([fecha], offline, calendario)
+    if fecha in encontrados:
+        return encontrados[fecha]
+    if offline:
+        print(f"{fecha}: ⚠️  Sin conexión y sin datos en la caché.")
+        return []
+    eventos = leer_calendario.obtener_eventos_del_dia(servicio, fecha, calendario)
+    guardar({fecha: eventos}, calendario)
+    return eventos
+
+def obtener_eventos_rango(servicio, fecha_inicio, fecha_fin, offline=False, calendario=None):
+    # Solo se pide a la API el tramo entre el primer y el último día que faltan
+    fechas = list(fechas_entre(fecha_inicio, fecha_fin))
+    eventos_por_dia = leer(fechas, offline, calendario)
+    faltan = [f for f in fechas if f not in eventos_por_dia]
+    if faltan and offline:
+        print(f"⚠️  Sin conexión: {len(faltan)} días sin datos en la caché.")
+    elif faltan:
+        nuevos = leer_calendario.obtener_eventos_rango(servicio, faltan[0], faltan[-1], calendario)
+        del_tramo = {f: nuevos.get(f, []) for f in fechas_entre(faltan[0], faltan[-1])}
+        guardar(del_tramo, calendario)
+        eventos_por_dia.update(del_tramo)
+    return {f: e for f, e in eventos_por_dia.items() if e}
@@ -0,0 +1,74 @@
+import os
+import json
+import http.client
+from pathlib import Path
+
+# Cliente del servicio local de registro (servicio_registro.py).
+# Solo usa la biblioteca estándar para que los scripts arranquen rápido: si el
+# servicio no está en marcha, con_servicio ejecuta la operación en este mismo
+# proceso. REGISTRO_SERVICIO=0 desactiva el servicio y ejecuta siempre en local.
+# Cada petición lleva el token que el servicio deja al arrancar en RUTA_TOKEN,
+# legible solo por el usuario que lo ejecuta.
+RUTA_TOKEN = Path("../cache/servicio.token")
+CABECERA_TOKEN = "X-Registro-Token"
+HOST = os.getenv("REGISTRO_HOST", "127.0.0.1")
+PUERTO = int(os.getenv("REGISTRO_PUERTO", "8765"))
+ACTIVO = os.getenv("REGISTRO_SERVICIO", "1") != "0"
+TIMEOUT_CONEXION = 0.5
+
+class ServicioNoDisponible(Exception):
+    pass
+
+class ErrorServicio(Exception):
+    # La operación ha fallado dentro del servicio
+    def __init__(self, mensaje, tipo=None):
+        super().__init__(mensaje)
+        self.tipo = tipo
+
+def leer_token():
+    try:
+        return RUTA_TOKEN.read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+
+def llamar(operacion, timeout=None, **parametros):
+    # Solo la conexión tiene un tiempo límite corto; la operación puede tardar minutos.
+    # Con timeout, una respuesta que no llega a tiempo lanza TimeoutError: la petición
+    # ya se ha enviado y el servicio puede haberla ejecutado
+    if not ACTIVO:
+        raise ServicioNoDisponible("servicio desactivado")
+    token = leer_token()
+    if not token:
+        raise ServicioNoDisponible("no hay token del servicio")
+    conexion = http.client.HTTPConnection(HOST, PUERTO, timeout=TIMEOUT_CONEXION)
+    try:
+        try:
+            conexion.connect()
+        except OSError as e:
+            raise ServicioNoDisponible(str(e)) from e
+        conexion.sock.settimeout(timeout)
+        cuerpo = json.dumps(parametros, ensure_ascii=False).encode("utf-8")
+        conexion.request("POST", f"/{operacion}", cuerpo, {"Content-Type": "application/json", CABECERA_TOKEN: token})
+        respuesta = json.loads(conexion.getresponse().read())
+    finally:
+        conexion.close()
+    # Lo que la operación ha impreso en el servicio
+    if respuesta.get("salida"):
+        print(respuesta["salida"], end="")
+    if not respuesta["ok"]:
+        raise ErrorServicio(respuesta["error"], respuesta.get("tipo"))
+    return respuesta["resultado"]
+
+def con_servicio(operacion, local, timeout=None, **parametros):
+    # Ejecuta la operación en el servicio o, si no acepta la conexión, llamando a local(**parametros)
+    try:
+        return llamar(operacion, timeout, **parametros)
+    except ServicioNoDisponible:
+        return local(**parametros)
+
+def disponible():
+    try:
+        llamar("estado")
+        return True
+    except ServicioNoDisponible:
+        return False
@@ -0,0 +1,108 @@
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Cola de trabajos en segundo plano para la interfaz Tk.
+# Los trabajos se ejecutan en un pool de hilos y nunca tocan los widgets:
+# el progreso y los resultados se dejan en una cola que el bucle de Tk
+# atiende periódicamente con root.after.
+
+class Cancelado(Exception):
+    pass
+
+class Trabajo:
+    def __init__(self, descripcion, eventos):
+        self.descripcion = descripcion
+        self.progreso = (0, 0)
+        self._eventos = eventos
+        self._cancelado = threading.Event()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    def comprobar(self):
+        if self.cancelado:
+            raise Cancelado()
+
+    def avanzar(self, hechos, total):
+        self._eventos.put(("progreso", self, (hechos, total)))
+
+class ColaTrabajos:
+    def __init__(self, root, hilos=2, intervalo_ms=100, al_cambiar=None):
+        # al_cambiar(activos) se llama en el hilo de Tk cada vez que cambia el progreso
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self.al_cambiar = al_cambiar
+        self.activos = []
+        self._eventos = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajo")
+        self._callbacks = {}
+        root.after(intervalo_ms, self._atender)
+
+    def enviar(self, descripcion, funcion, al_terminar=None):
+        # funcion(trabajo) se ejecuta en otro hilo; al_terminar(estado, valor) en el de Tk,
+        # con estado "fin", "error" o "cancelado"
+        trabajo = Trabajo(descripcion, self._eventos)
+        self.activos.append(trabajo)
+        self._callbacks[trabajo] = al_terminar
+
+        def ejecutar():
+            try:
+                self._eventos.put(("fin", trabajo, funcion(trabajo)))
+            except Cancelado:
+                self._eventos.put(("cancelado", trabajo, None))
+            except Exception as e:
+                self._eventos.put(("error", trabajo, e))
+
+        self._pool.submit(ejecutar)
+        self._notificar()
+        return trabajo
+
+    def cancelar_todos(self):
+        for trabajo in self.activos:
+            trabajo.cancelar()
+
+    def cerrar(self):
+        self.cancelar_todos()
+        self._pool.shutdown(wait=False)
+
+    def _notificar(self):
+        if self.al_cambiar:
+            self.al_cambiar(list(self.activos))
+
+    def _atender(self):
+        hubo_cambios = False
+        while True:
+            try:
+                estado, trabajo, valor = self._eventos.get_nowait()
+            except queue.Empty:
+                break
+            hubo_cambios = True
+            if estado == "progreso":
+                trabajo.progreso = valor
+                continue
+            self.activos.remove(trabajo)
+            al_terminar = self._callbacks.pop(trabajo)
+            if al_terminar:
+                al_terminar(estado, valor)
+        if hubo_cambios:
+            self._notificar()
+        self.root.after(self.intervalo_ms, self._atender)
+
+def ejecutar_proceso(trabajo, comando):
+    # Como subprocess.run(comando, check=True), pero termina el proceso si se cancela el trabajo
+    proceso = subprocess.Popen(comando)
+    while proceso.poll() is None:
+        if trabajo.cancelado:
+            proceso.terminate()
+            proceso.wait()
+            raise Cancelado()
+        time.sleep(0.1)
+    if proceso.returncode != 0:
+        raise subprocess.CalledProcessError(proceso.returncode, comando)
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+import almacen_registros
+import diario_registros
+from almacen_registros import cargar_mes, leer_registros
+from registro import Registro
+from plantilla import por_id, por_nombre
+from instrumentacion import argumento_perfil, ejecutar
+
+# Consultas por rango de fechas y por trabajador sobre el almacén mensual.
+# Solo se abren los segmentos de los meses del rango; con trabajadores se lee
+# únicamente su bloque gracias al índice de la cabecera. Los meses leídos
+# enteros se guardan en memoria como Registro indexados por día {ordinal: [Registro]}
+# (bastante menos memoria que los dicts en el servicio local), y se descartan
+# si cambia la fecha de modificación o el tamaño del segmento (o del archivo
+# del año) o llegan operaciones nuevas del mes al diario. Dentro del servicio
+# local la caché se mantiene entre consultas.
+MAX_MESES_EN_MEMORIA = 36
+
+_cache = OrderedDict()
+_bloqueo = threading.Lock()
+
+def _firma(anio, mes):
+    for ruta in (almacen_registros.ruta_segmento(anio, mes), almacen_registros.ruta_archivo(anio)):
+        try:
+            estado = os.stat(ruta)
+            return (str(ruta), estado.st_mtime_ns, estado.st_size, diario_registros.version(anio, mes))
+        except FileNotFoundError:
+            continue
+    return None  # Formato antiguo: no se guarda en caché
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+def _mes_por_dia(anio, mes):
+    # {ordinal: [Registro ordenados por trabajador]}
+    firma = _firma(anio, mes)
+    with _bloqueo:
+        if firma and (anio, mes) in _cache and _cache[(anio, mes)][0] == firma:
+            _cache.move_to_end((anio, mes))
+            return _cache[(anio, mes)][1]
+    por_dia = {}
+    for trabajador_id, registros in sorted(cargar_mes(anio, mes).items()):
+        for r in map(Registro.desde_dict, registros):
+            por_dia.setdefault(r.dia, []).append(r)
+    if firma:
+        with _bloqueo:
+            _cache[(anio, mes)] = (firma, por_dia)
+            while len(_cache) > MAX_MESES_EN_MEMORIA:
+                _cache.popitem(last=False)
+    return por_dia
+
+def registros_entre(desde, hasta, trabajadores=None):
+    # Registros con fecha entre desde y hasta (incluidas), ordenados por fecha y trabajador
+    desde, hasta = date.fromisoformat(str(desde)), date.fromisoformat(str(hasta))
+    inicio, fin = desde.toordinal(), hasta.toordinal()
+    resultado = []
+    for anio, mes in _meses(desde, hasta):
+        if trabajadores:
+            registros = (Registro.desde_dict(r) for t in trabajadores for r in leer_registros(t, anio, mes))
+            resultado.extend(r for r in registros if inicio <= r.dia <= fin)
+        else:
+            por_dia = _mes_por_dia(anio, mes)
+            resultado.extend(r for d in por_dia if inicio <= d <= fin for r in por_dia[d])
+    resultado.sort(key=lambda r: (r.dia, r.id))
+    # Se devuelven con el esquema JSON del almacén (el servicio los envía tal cual)
+    return [r.a_dict() for r in resultado]
+
+def trabajadores_del_dia(fecha):
+    # Ids de quienes tienen registro ese día
+    fecha = date.fromisoformat(str(fecha))
+    return [r.id for r in _mes_por_dia(fecha.year, fecha.month).get(fecha.toordinal(), [])]
+
+def resolver_trabajador(texto):
+    # Acepta id, nombre o alias
+    trabajador = por_id(texto) or por_nombre(texto)
+    return str(trabajador["id"]) if trabajador else None
+
+def imprimir(registros):
+    if not registros:
+        print("⚠️ No hay registros para la consulta.")
+        return
+    print(f"{'Fecha':<11} {'Trabajador':<30} {'Entrada':>7} {'Salida':>7} {'Horas':>6}  Estado")
+    total = 0.0
+    for r in registros:
+        firma = " ✍️" if r.get("firmado_por_pin") else ""
+        horas = r.get("horas", 0.0)
+        if isinstance(horas, str):
+            horas = f"{horas:>6}"  # Mal escritas: a_dict las devuelve tal como están guardadas
+        else:
+            total += horas
+            horas = f"{horas:>6.2f}"
+        print(f"{r['fecha']:<11} {(r['nombre'] + ' ' + r.get('apellidos', ''))[:30]:<30} {r.get('entrada', ''):>7} "
+              f"{r.get('salida', ''):>7} {horas}  {r.get('estado', '')}{firma}")
+    print(f"{len(registros)} registros, {total:.2f} h")
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fecha", help="Un solo día (AAAA-MM-DD)")
+    parser.add_argument("--desde", help="Primer día del rango (AAAA-MM-DD)")
+    parser.add_argument("--hasta", help="Último día del rango (por defecto, igual que --desde)")
+    parser.add_argument("--trabajador", nargs="+", help="ID, nombre o alias (o varios)")
+    parser.add_argument("--json", action="store_true", help="Imprimir los registros en JSON")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+
+    desde = args.fecha or args.desde
+    if not desde:
+        parser.error("indica --fecha o --desde")
+    hasta = args.fecha or args.hasta or desde
+
+    trabajadores = None
+    if args.trabajador:
+        trabajadores = [resolver_trabajador(t) for t in args.trabajador]
+        if None in trabajadores:
+            print(f"⚠️ Trabajador no encontrado: {args.trabajador[trabajadores.index(None)]}")
+            sys.exit(1)
+
+    if args.profile:
+        # Se perfila la consulta en este proceso, no la petición al servicio
+        registros = ejecutar(registros_entre, args.profile, desde, hasta, trabajadores)
+    else:
+        from cliente_registro import con_servicio
+        registros = con_servicio("consultar", registros_entre, desde=desde, hasta=hasta, trabajadores=trabajadores)
+    if args.json:
+        print(json.dumps(registros, ensure_ascii=False, indent=2))
+    else:
+        imprimir(registros)
@@ -0,0 +1,186 @@
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# Diario de cambios del almacén: registros/diario.jsonl, una línea por operación
+#   {"op": "guardar", "registro": {...}, "conservar_firmados": true}
+#   {"op": "borrar", "fecha": "AAAA-MM-DD", "id": "3"}
+# Con conservar_firmados la operación no toca un registro firmado con PIN.
+# Los escritores añaden sus operaciones al final con un único write + fsync por
+# lote, protegidos por el cerrojo registros/diario.lock, así que el quiosco, la
+# reconstrucción nocturna y generar_registros no se pisan nunca. Las lecturas
+# aplican las operaciones del mes encima del segmento y la compactación
+# (almacen_registros.compactar) las vuelca a los segmentos y empieza un diario
+# nuevo. La primera línea identifica cada diario: {"generacion": "..."}.
+RUTA_DIARIO = Path("../registros/diario.jsonl")
+RUTA_CERROJO = Path("../registros/diario.lock")
+
+_hilos = threading.RLock()
+_bloqueo_cache = threading.Lock()
+_cerrojo = {"nivel": 0, "f": None}
+_cache = {"firma": None, "generacion": None, "por_mes": {}, "total": 0}
+
+if os.name == "nt":
+    import msvcrt
+
+    def _bloquear(f):
+        # msvcrt.locking se rinde tras 10 intentos: se insiste hasta conseguirlo
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _desbloquear(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _bloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _desbloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def cerrojo():
+    # Exclusivo entre procesos y entre hilos; se puede anidar en el mismo hilo
+    with _hilos:
+        if _cerrojo["nivel"] == 0:
+            RUTA_CERROJO.parent.mkdir(parents=True, exist_ok=True)
+            f = open(RUTA_CERROJO, "a+b")
+            f.seek(0)
+            _bloquear(f)
+            _cerrojo["f"] = f
+        _cerrojo["nivel"] += 1
+        try:
+            yield
+        finally:
+            _cerrojo["nivel"] -= 1
+            if _cerrojo["nivel"] == 0:
+                _desbloquear(_cerrojo["f"])
+                _cerrojo["f"].close()
+                _cerrojo["f"] = None
+
+def _firma():
+    try:
+        estado = os.stat(RUTA_DIARIO)
+        return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+    except FileNotFoundError:
+        return None
+
+def _actual():
+    # Operaciones agrupadas por mes {(anio, mes): [op]}; se vuelve a leer solo si cambia el diario
+    firma = _firma()
+    with _bloqueo_cache:
+        if _cache["firma"] != firma:
+            generacion, por_mes, total = None, {}, 0
+            if firma:
+                with open(RUTA_DIARIO, "rb") as f:
+                    contenido = f.read()
+                for linea in contenido.split(b"\n"):
+                    try:
+                        op = json.loads(linea)
+                    except ValueError:
+                        continue  # Línea vacía o a medio escribir por un corte de luz
+                    if "generacion" in op:
+                        generacion = op["generacion"]
+                        continue
+                    fecha = op["registro"]["fecha"] if op["op"] == "guardar" else op["fecha"]
+                    por_mes.setdefault((int(fecha[:4]), int(fecha[5:7])), []).append(op)
+                    total += 1
+            _cache.update(firma=firma, generacion=generacion, por_mes=por_mes, total=total)
+        return _cache
+
+def del_mes(anio, mes):
+    return _actual()["por_mes"].get((anio, mes), [])
+
+def instantanea(anio, mes):
+    # (firma del diario, operaciones del mes) de una misma lectura
+    _actual()
+    with _bloqueo_cache:
+        return _cache["firma"], _cache["por_mes"].get((anio, mes), [])
+
+def firma():
+    # Cambia con cada anotación y con cada compactación
+    return _firma()
+
+def meses():
+    return sorted(_actual()["por_mes"])
+
+def pendientes():
+    # Operaciones aún sin compactar
+    return _actual()["total"]
+
+def version(anio, mes):
+    # Cambia con cada operación del mes y con cada compactación (para cachés de lectura)
+    actual = _actual()
+    return (actual["generacion"], len(actual["por_mes"].get((anio, mes), [])))
+
+def anotar(operaciones):
+    # Añade las operaciones al final del diario con un solo fsync
+    if not operaciones:
+        return
+    contenido = b"".join(
+        json.dumps(op, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n" for op in operaciones
+    )
+    with cerrojo():
+        if not RUTA_DIARIO.exists():
+            nuevo()
+        with open(RUTA_DIARIO, "r+b") as f:
+            # Una última línea sin "\n" quedó a medias (corte de luz): se recorta hasta
+            # el último "\n" para que el lote nuevo no se pegue a ella y se pierda
+            fin = f.seek(0, os.SEEK_END)
+            if fin:
+                f.seek(fin - 1)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b"\n") + 1)
+            f.seek(0, os.SEEK_END)
+            f.write(contenido)
+            f.flush()
+            os.fsync(f.fileno())
+
+def nuevo():
+    # Sustituye el diario por uno vacío con una generación nueva (tras compactar)
+    with cerrojo():
+        RUTA_DIARIO.parent.mkdir(parents=True, exist_ok=True)
+        temporal = RUTA_DIARIO.with_suffix(".tmp")
+        with open(temporal, "wb") as f:
+            f.write(json.dumps({"generacion": uuid.uuid4().hex}).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, RUTA_DIARIO)
+        if os.name != "nt":
+            descriptor = os.open(RUTA_DIARIO.parent, os.O_RDONLY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+def aplicar(por_trabajador, operaciones, trabajador_id=None):
+    # Aplica las operaciones en orden sobre {id: [registros]} (solo las de trabajador_id si se indica)
+    tocados = set()
+    for op in operaciones:
+        if op["op"] == "guardar":
+            registro = op["registro"]
+            clave, fecha = str(registro["id"]), registro["fecha"]
+        else:
+            clave, fecha = str(op["id"]), op["fecha"]
+        if trabajador_id is not None and clave != str(trabajador_id):
+            continue
+        lista = por_trabajador.setdefault(clave, [])
+        if op.get("conservar_firmados") and any(r["fecha"] == fecha and r.get("firmado_por_pin") for r in lista):
+            continue
+        lista[:] = [r for r in lista if r["fecha"] != fecha]
+        if op["op"] == "guardar":
+            lista.append(dict(registro))  # Copia: quien lee puede modificar el registro
+        tocados.add(clave)
+    for clave in tocados:
+        por_trabajador[clave].sort(key=lambda r: r["fecha"])
+    return tocados
@@ -0,0 +1,135 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import date
+from pathlib import Path
+from almacen_registros import cargar_mes, leer_registros
+from registro import Registro
+from plantilla import por_id
+from instrumentacion import tramo, argumento_perfil, ejecutar
+
+# Exportación para la gestoría en CSV o JSON Lines, sin pasar por los PDFs.
+# Todo son generadores encadenados (meses -> días -> registros -> filas) y cada
+# fila se escribe según sale, así que en memoria solo hay un mes cada vez,
+# sea cual sea el rango. Con trabajadores solo se lee su bloque de cada segmento.
+RUTA_EXPORTACIONES = Path("../exportaciones/")
+CAMPOS = ("id", "nif", "fecha", "entrada", "salida", "horas", "estado")
+FORMATOS = ("csv", "jsonl")
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+def dias(desde, hasta, trabajadores=None):
+    # (fecha, [registros del día ordenados por trabajador]) de desde a hasta
+    inicio, fin = desde.isoformat(), hasta.isoformat()
+    for anio, mes in _meses(desde, hasta):
+        if trabajadores:
+            por_trabajador = {t: leer_registros(t, anio, mes) for t in trabajadores}
+        else:
+            por_trabajador = cargar_mes(anio, mes)
+        por_fecha = {}
+        for trabajador_id in sorted(por_trabajador, key=str):
+            for r in por_trabajador[trabajador_id]:
+                if inicio <= r["fecha"] <= fin:
+                    por_fecha.setdefault(r["fecha"], []).append(r)
+        del por_trabajador
+        for fecha in sorted(por_fecha):
+            yield fecha, por_fecha.pop(fecha)
+
+def registros(desde, hasta, trabajadores=None, estados=None):
+    for _, del_dia in dias(desde, hasta, trabajadores):
+        for r in del_dia:
+            if not estados or r.get("estado") in estados:
+                yield r
+
+def filas(registros):
+    # Una fila normalizada por registro: horas siempre con dos decimales
+    for r in map(Registro.desde_dict, registros):
+        trabajador = por_id(r.id) or {}
+        yield {
+            "id": r.id,
+            "nif": trabajador.get("nif", r.nif),
+            "fecha": r.fecha,
+            "entrada": r.texto("entrada"),
+            "salida": r.texto("salida"),
+            "horas": r.texto("horas"),
+            "estado": r.estado,
+        }
+
+def escribir(filas, destino, formato="csv"):
+    # Escribe las filas en el flujo de texto destino y devuelve cuántas van
+    total = 0
+    if formato == "csv":
+        escritor = csv.DictWriter(destino, fieldnames=CAMPOS, delimiter=";")
+        escritor.writeheader()
+        for fila in filas:
+            escritor.writerow(fila)
+            total += 1
+    else:
+        for fila in filas:
+            destino.write(json.dumps(fila, ensure_ascii=False) + "\n")
+            total += 1
+    return total
+
+def _abrir(ruta, comprimir):
+    if comprimir:
+        return io.TextIOWrapper(gzip.open(ruta, "wb"), encoding="utf-8", newline="")
+    return open(ruta, "w", encoding="utf-8", newline="")
+
+def exportar(desde, hasta, ruta=None, formato="csv", comprimir=False, trabajadores=None, estados=None):
+    # Devuelve (ruta, filas escritas). Se escribe en un temporal que se renombra al
+    # terminar, para no dejar a medias un fichero que la gestoría pueda recoger
+    desde, hasta = date.fromisoformat(str(desde)), date.fromisoformat(str(hasta))
+    if ruta is None:
+        RUTA_EXPORTACIONES.mkdir(parents=True, exist_ok=True)
+        ruta = RUTA_EXPORTACIONES / f"registros_{desde}_{hasta}.{formato}{'.gz' if comprimir else ''}"
+    ruta = Path(ruta)
+    temporal = ruta.with_name(ruta.name + ".tmp")
+    with tramo("exportar", desde=str(desde), hasta=str(hasta), formato=formato) as t:
+        with _abrir(temporal, comprimir) as destino:
+            total = escribir(filas(registros(desde, hasta, trabajadores, estados)), destino, formato)
+        os.replace(temporal, ruta)
+        t["filas"] = total
+    return ruta, total
+
+if __name__ == "__main__":
+    import argparse
+    from consultar import resolver_trabajador
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--desde", required=True, help="Primer día (AAAA-MM-DD)")
+    parser.add_argument("--hasta", required=True, help="Último día (AAAA-MM-DD)")
+    parser.add_argument("--formato", choices=FORMATOS, help="Por defecto, según la extensión de --salida o csv")
+    parser.add_argument("--salida", help="Fichero de destino ('-' para la salida estándar)")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir con gzip (también si --salida acaba en .gz)")
+    parser.add_argument("--trabajador", nargs="+", help="ID, nombre o alias (o varios)")
+    parser.add_argument("--estado", nargs="+", help="Solo estos estados (trabajado, vacaciones...)")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+
+    formato = args.formato
+    if formato is None and args.salida:
+        sufijos = [s.lstrip(".") for s in Path(args.salida).suffixes]
+        formato = next((s for s in sufijos if s in FORMATOS), None)
+    formato = formato or "csv"
+    comprimir = args.gzip or bool(args.salida and args.salida.endswith(".gz"))
+
+    trabajadores = None
+    if args.trabajador:
+        trabajadores = [resolver_trabajador(t) for t in args.trabajador]
+        if None in trabajadores:
+            print(f"⚠️ Trabajador no encontrado: {args.trabajador[trabajadores.index(None)]}")
+            sys.exit(1)
+
+    if args.salida == "-":
+        desde, hasta = date.fromisoformat(args.desde), date.fromisoformat(args.hasta)
+        ejecutar(escribir, args.profile, filas(registros(desde, hasta, trabajadores, args.estado)), sys.stdout, formato)
+    else:
+        ruta, total = ejecutar(exportar, args.profile, args.desde, args.hasta, args.salida, formato, comprimir,
+                               trabajadores, args.estado)
+        print(f"✅ {total} filas exportadas en {ruta}")
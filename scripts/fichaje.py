@@ -0,0 +1,79 @@
+from datetime import datetime
+import almacen_registros
+import diario_registros
+from registro import calcular_horas
+from plantilla import por_pin
+from instrumentacion import tramo, argumento_perfil, ejecutar
+
+# Fichaje directo desde el terminal: escribe la entrada o la salida en el
+# registro del día sin pasar por el calendario ni por la red. La lectura y la
+# anotación en el diario van dentro del cerrojo del diario, así que dos
+# terminales (o el quiosco y la reconstrucción nocturna) no pierden fichajes.
+
+def registrar_fichaje(trabajador, tipo, pin, ahora=None):
+    if tipo not in ("entrada", "salida"):
+        raise ValueError(f"Tipo de fichaje no válido: {tipo}")
+    ahora = ahora or datetime.now()
+    fecha = ahora.date().isoformat()
+
+    with diario_registros.cerrojo(), tramo("fichaje.registrar", tipo=tipo):
+        registro = almacen_registros.leer_registro(fecha, trabajador["id"]) or {
+            "id": trabajador["id"],
+            "nombre": trabajador["nombre"],
+            "apellidos": trabajador["apellidos"],
+            "nif": trabajador["nif"],
+            "fecha": fecha,
+            "entrada": "",
+            "salida": "",
+            "estado": "trabajado",
+        }
+
+        # Un registro sin firmar viene del calendario: el fichaje real lo sustituye,
+        # también la entrada en una salida (la firma cubre todo el registro y esa
+        # entrada no la ha fichado nadie). Si ya hay una entrada firmada se conserva
+        # la primera del día; la salida siempre es la última.
+        firmado = registro.get("firmado_por_pin")
+        if tipo == "salida":
+            registro["salida"] = ahora.strftime("%H:%M")
+            if not firmado:
+                registro["entrada"] = ""
+        elif not (firmado and registro.get("entrada")):
+            registro["entrada"] = ahora.strftime("%H:%M")
+            if not firmado:
+                registro["salida"] = ""
+        registro["firmado_por_pin"] = True
+        registro["pin_usado"] = str(pin)
+        registro["timestamp_firma"] = ahora.isoformat(timespec="seconds")
+
+        registro.pop("horas", None)
+        if registro.get("entrada") and registro.get("salida"):
+            registro["horas"] = calcular_horas(registro["entrada"], registro["salida"])
+
+        almacen_registros.guardar_registro(registro)
+    return registro
+
+def fichar_por_pin(pin, tipo):
+    trabajador = por_pin(pin)
+    if not trabajador or not trabajador.get("activo", True):
+        raise ValueError("PIN no válido o trabajador inactivo.")
+    return registrar_fichaje(trabajador, tipo, pin)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pin", required=True)
+    parser.add_argument("--tipo", choices=["entrada", "salida"], required=True)
+    argumento_perfil(parser)
+    args = parser.parse_args()
+
+    from cliente_registro import con_servicio, ErrorServicio
+    try:
+        if args.profile:
+            registro = ejecutar(fichar_por_pin, args.profile, args.pin, args.tipo)
+        else:
+            registro = con_servicio("fichar", fichar_por_pin, pin=args.pin, tipo=args.tipo)
+    except (ValueError, ErrorServicio) as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+    print(f"✅ {registro['nombre']} ha fichado {args.tipo} a las {registro[args.tipo]}")
@@ -1,13 +1,15 @@
 from fpdf import FPDF
-import json
 from pathlib import Path
-from datetime import datetime
-import calendar
 import unicodedata
 import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from almacen_registros import leer_registros, cargar_mes, totales_mes, totales_del_mes, calcular_totales
+from registro import Registro
+from plantilla import por_id, cargar_trabajadores
+from instrumentacion import tramo, argumento_perfil, ejecutar
 
-RUTA_REGISTROS = Path("../registros/preparados/")
-RUTA_TRABAJADORES = Path("../trabajadores/listado.json")
 RUTA_PDFS = Path("../pdfs")
 
 NOMBRE_EMPRESA = "Juan Sande Álvarez"
@@ -28,59 +30,22 @@ def normalizar(s):
         if unicodedata.category(c) != 'Mn'
     ).replace(" ", "")
 
-def cargar_trabajadores():
-    with open(RUTA_TRABAJADORES, encoding="utf-8") as f:
-        return json.load(f)
-
 def obtener_nombre_dia(fecha):
     dias = ["L", "M", "X", "J", "V", "S", "D"]
     return dias[fecha.weekday()]
 
-def horas_str_a_float(horas_str):
-    h, m = map(int, horas_str.split(":"))
-    return h + m / 60
-
-def generar_pdf(trabajador_id, anio, mes):
-    trabajadores = cargar_trabajadores()
-    trabajador = next((t for t in trabajadores if str(t['id']) == str(trabajador_id)), None)
-    if not trabajador:
-        print(f"⚠️ Trabajador con ID {trabajador_id} no encontrado.")
-        return
-
-    registros_mes = []
-    total_horas = 0.0
-    total_extras = 0.0
-
-    for dia in range(1, calendar.monthrange(anio, mes)[1] + 1):
-        fecha = datetime(anio, mes, dia)
-        fecha_str = fecha.strftime("%Y-%m-%d")
-        carpeta = RUTA_REGISTROS / fecha_str
-        archivo = carpeta / f"{trabajador_id}.json"
-        if archivo.exists():
-            with open(archivo, encoding="utf-8") as f:
-                data = json.load(f)
-                registros_mes.append(data)
-                if data.get("estado") == "trabajado" and "horas" in data:
-                    horas = horas_str_a_float(data["horas"])
-                    total_horas += horas
-                    if horas > 8:
-                        total_extras += horas - 8
-
-    if not registros_mes:
-        print(f"⚠️ No hay registros para {trabajador['nombre']} en {mes:02d}/{anio}")
-        return
-
-    nombre_archivo_base = f"{anio}_{mes:02d}_RH_{normalizar(trabajador['nombre'])}{normalizar(trabajador['apellidos'])}.pdf"
-    carpeta_salida = RUTA_PDFS / str(anio) / f"{normalizar(trabajador['nombre'])}{normalizar(trabajador['apellidos'])}"
-    carpeta_salida.mkdir(parents=True, exist_ok=True)
-
-    nombre_archivo = carpeta_salida / nombre_archivo_base
+def _archivo_libre(carpeta, nombre_base):
+    # No se sobrescriben PDFs ya generados: "nombre (2).pdf", "nombre (3).pdf"...
+    carpeta.mkdir(parents=True, exist_ok=True)
+    nombre_archivo = carpeta / nombre_base
     contador = 2
     while nombre_archivo.exists():
-        nombre_archivo = carpeta_salida / f"{nombre_archivo_base[:-4]} ({contador}).pdf"
+        nombre_archivo = carpeta / f"{nombre_base[:-4]} ({contador}).pdf"
         contador += 1
+    return nombre_archivo
 
-    pdf = PDF()
+def _seccion_trabajador(pdf, trabajador, anio, mes, registros_mes, totales):
+    # Añade al documento las páginas de un trabajador: cabecera, tabla de días y totales
     pdf.titulo = f"Registro horario - {mes:02d}/{anio}"
     pdf.add_page()
     pdf.set_font("Arial", size=10)
@@ -100,16 +65,16 @@ def generar_pdf(trabajador_id, anio, mes):
     pdf.ln()
 
     pdf.set_font("Arial", size=9)
-    for r in registros_mes:
-        fecha_dt = datetime.strptime(r["fecha"], "%Y-%m-%d")
-        dia = fecha_dt.strftime("%d-%m-%Y")
-        dia_semana = obtener_nombre_dia(fecha_dt)
-        entrada = r.get("entrada", "")
-        salida = r.get("salida", "")
-        firma_e = "S" if entrada and r.get("firmado_por_pin") else ""
-        firma_s = "S" if salida and r.get("firmado_por_pin") else ""
-        horas = r.get("horas", "")
-        estado = r.get("estado", "")
+    for r in map(Registro.desde_dict, registros_mes):
+        fecha = r.fecha_date()
+        dia = f"{fecha.day:02d}-{fecha.month:02d}-{fecha.year}"
+        dia_semana = obtener_nombre_dia(fecha)
+        entrada = r.texto("entrada")
+        salida = r.texto("salida")
+        firma_e = "S" if entrada and r.firmado else ""
+        firma_s = "S" if salida and r.firmado else ""
+        horas = r.texto("horas")
+        estado = r.estado
 
         pdf.cell(28, 7, f"{dia} ({dia_semana})", 1)
         pdf.cell(20, 7, entrada, 1)
@@ -122,21 +87,183 @@ def generar_pdf(trabajador_id, anio, mes):
 
     pdf.ln(3)
     pdf.set_font("Arial", "B", 9)
-    pdf.cell(0, 8, f"Total horas trabajadas: {round(total_horas, 2)} h", ln=True)
-    if total_extras > 0:
-        pdf.cell(0, 8, f"Total horas extra: {round(total_extras, 2)} h", ln=True)
+    pdf.cell(0, 8, f"Total horas trabajadas: {round(totales['horas'], 2)} h", ln=True)
+    if totales["extras"] > 0:
+        pdf.cell(0, 8, f"Total horas extra: {round(totales['extras'], 2)} h", ln=True)
     pdf.ln(5)
     pdf.set_font("Arial", size=8)
     pdf.multi_cell(0, 6, "Este documento ha sido generado automáticamente a partir del registro horario firmado con PIN personal por el trabajador/a. Conservar durante 4 años según normativa laboral vigente.")
 
-    pdf.output(str(nombre_archivo))
+def generar_pdf(trabajador_id, anio, mes, registros_mes=None, totales=None):
+    trabajador = por_id(trabajador_id)
+    if not trabajador:
+        print(f"⚠️ Trabajador con ID {trabajador_id} no encontrado.")
+        return
+
+    if registros_mes is None:
+        with tramo("pdf.cargar_registros", trabajador=str(trabajador_id)):
+            registros_mes = leer_registros(trabajador_id, anio, mes)
+
+    if totales is None:
+        # Totales ya agregados en la cabecera del segmento: no hace falta recorrer el mes
+        totales = totales_mes(trabajador_id, anio, mes)
+
+    if not registros_mes:
+        print(f"⚠️ No hay registros para {trabajador['nombre']} en {mes:02d}/{anio}")
+        return
+
+    nombre_archivo = _archivo_libre(
+        RUTA_PDFS / str(anio) / f"{normalizar(trabajador['nombre'])}{normalizar(trabajador['apellidos'])}",
+        f"{anio}_{mes:02d}_RH_{normalizar(trabajador['nombre'])}{normalizar(trabajador['apellidos'])}.pdf"
+    )
+
+    with tramo("pdf.render", trabajador=str(trabajador_id), registros=len(registros_mes)):
+        pdf = PDF()
+        _seccion_trabajador(pdf, trabajador, anio, mes, registros_mes, totales)
+
+    with tramo("pdf.salida", trabajador=str(trabajador_id)):
+        pdf.output(str(nombre_archivo))
     print(f"✅ PDF generado: {nombre_archivo}")
+    return str(nombre_archivo)
+
+def generar_pdf_consolidado(anio, mes, trabajadores=None):
+    # Un único PDF del mes con una sección por trabajador (por defecto, todos los activos),
+    # para enviar a la gestoría. Los registros se leen trabajador a trabajador con el
+    # índice del segmento, así solo hay en memoria los de uno cada vez.
+    if trabajadores is None:
+        trabajadores = [t for t in cargar_trabajadores() if t.get("activo", True)]
+    trabajadores = [por_id(t["id"] if isinstance(t, dict) else t) for t in trabajadores]
+    totales = totales_del_mes(anio, mes)
+
+    pdf = PDF()
+    secciones = 0
+    for trabajador in trabajadores:
+        if not trabajador:
+            continue
+        with tramo("pdf.cargar_registros", trabajador=str(trabajador["id"])):
+            registros_mes = leer_registros(trabajador["id"], anio, mes)
+        if not registros_mes:
+            print(f"⚠️ No hay registros para {trabajador['nombre']} en {mes:02d}/{anio}")
+            continue
+        # Sin los totales del trabajador (segmento sin totales en la cabecera, o su primer
+        # registro del mes se anotó después de leer totales_del_mes) se calculan de sus registros
+        totales_trabajador = totales.get(str(trabajador["id"])) or calcular_totales(registros_mes)
+        with tramo("pdf.render", trabajador=str(trabajador["id"]), registros=len(registros_mes)):
+            _seccion_trabajador(pdf, trabajador, anio, mes, registros_mes, totales_trabajador)
+        secciones += 1
+
+    if not secciones:
+        print(f"⚠️ No hay registros de ningún trabajador en {mes:02d}/{anio}")
+        return
+
+    nombre_archivo = _archivo_libre(RUTA_PDFS / str(anio), f"{anio}_{mes:02d}_RH_Plantilla.pdf")
+    with tramo("pdf.salida", secciones=secciones):
+        pdf.output(str(nombre_archivo))
+    print(f"✅ PDF generado: {nombre_archivo} ({secciones} trabajadores)")
+    return str(nombre_archivo)
+
+def generar_consolidados(anio, meses, trabajadores=None, al_avanzar=None, cancelado=None):
+    # Un PDF consolidado por mes; mismos resultados que generar_lote pero sin trabajador
+    meses = list(meses)
+    resultados = []
+    for hechos, mes in enumerate(meses, 1):
+        if cancelado and cancelado():
+            break
+        resultado = {"anio": anio, "mes": mes, "archivo": None, "error": None}
+        try:
+            resultado["archivo"] = generar_pdf_consolidado(anio, mes, trabajadores)
+        except Exception as e:
+            print(f"❌ Error generando el PDF consolidado de {mes:02d}/{anio}: {e}")
+            resultado["error"] = str(e)
+        resultados.append(resultado)
+        if al_avanzar:
+            al_avanzar(hechos, len(meses))
+    return resultados
+
+def generar_pdfs_mes(trabajadores_ids, anio, mes):
+    # Una sola lectura del mes compartida por todos los trabajadores.
+    # Devuelve un resultado por trabajador: archivo generado (o None) y error (o None)
+    registros_mes = cargar_mes(anio, mes)
+    totales = totales_del_mes(anio, mes)
+    resultados = []
+    for trabajador_id in trabajadores_ids:
+        resultado = {"trabajador": str(trabajador_id), "anio": anio, "mes": mes, "archivo": None, "error": None}
+        try:
+            resultado["archivo"] = generar_pdf(
+                trabajador_id, anio, mes, registros_mes.get(str(trabajador_id), []), totales.get(str(trabajador_id))
+            )
+        except Exception as e:
+            print(f"❌ Error generando el PDF de {trabajador_id} para {mes:02d}/{anio}: {e}")
+            resultado["error"] = str(e)
+        resultados.append(resultado)
+    return resultados
+
+def generar_lote(trabajadores, anio, meses, procesos=None, al_avanzar=None, cancelado=None):
+    # Genera en este mismo intérprete los PDFs de todos los trabajadores y meses.
+    # Cada mes es una tarea del ProcessPoolExecutor; con procesos=1 no se crea el pool.
+    # trabajadores puede ser una lista de ids o de diccionarios del listado.
+    # al_avanzar(meses_hechos, total) informa del progreso; si cancelado() devuelve
+    # True no se empiezan más meses y se devuelven los resultados obtenidos hasta entonces.
+    ids = [str(t["id"]) if isinstance(t, dict) else str(t) for t in trabajadores]
+    meses = list(meses)
+    if procesos is None:
+        procesos = min(len(meses), os.cpu_count() or 1)
+
+    resultados = []
+    if procesos <= 1:
+        for hechos, mes in enumerate(meses, 1):
+            if cancelado and cancelado():
+                break
+            resultados.extend(generar_pdfs_mes(ids, anio, mes))
+            if al_avanzar:
+                al_avanzar(hechos, len(meses))
+        return resultados
+
+    # Sin fork: la interfaz y el servicio lanzan el lote desde un hilo y el hijo
+    # podría heredar un bloqueo tomado por otro (trazas, listado, diario...)
+    contexto = multiprocessing.get_context("spawn" if os.name == "nt" else "forkserver")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        futuros = {pool.submit(generar_pdfs_mes, ids, anio, mes): mes for mes in meses}
+        for hechos, futuro in enumerate(as_completed(futuros), 1):
+            mes = futuros[futuro]
+            try:
+                resultados.extend(futuro.result())
+            except Exception as e:
+                # El proceso hijo ha muerto: se marcan como fallidos todos los trabajadores del mes
+                resultados.extend(
+                    {"trabajador": i, "anio": anio, "mes": mes, "archivo": None, "error": str(e)} for i in ids
+                )
+            if al_avanzar:
+                al_avanzar(hechos, len(meses))
+            if cancelado and cancelado():
+                for pendiente in futuros:
+                    pendiente.cancel()
+                break
+    resultados.sort(key=lambda r: (ids.index(r["trabajador"]), r["mes"]))
+    return resultados
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument("--trabajador", required=True, help="ID del trabajador")
+    parser.add_argument("--trabajador", nargs="+", help="ID del trabajador (o varios)")
     parser.add_argument("--anio", type=int, required=True)
-    parser.add_argument("--mes", type=int, required=True)
+    parser.add_argument("--mes", type=int, nargs="+", required=True)
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos en paralelo")
+    parser.add_argument("--consolidado", action="store_true", help="Un solo PDF por mes con todos los trabajadores (por defecto, los activos)")
+    argumento_perfil(parser)
     args = parser.parse_args()
-    generar_pdf(args.trabajador, args.anio, args.mes)
+    if not args.consolidado and not args.trabajador:
+        parser.error("indica --trabajador o --consolidado")
+
+    from cliente_registro import con_servicio
+    if args.profile:
+        if args.consolidado:
+            resultados = ejecutar(generar_consolidados, args.profile, args.anio, args.mes, args.trabajador)
+        else:
+            resultados = ejecutar(generar_lote, args.profile, args.trabajador, args.anio, args.mes, procesos=args.procesos)
+    elif args.consolidado:
+        resultados = con_servicio("pdf_consolidado", generar_consolidados, anio=args.anio, meses=args.mes, trabajadores=args.trabajador)
+    else:
+        resultados = con_servicio("pdf", generar_lote, trabajadores=args.trabajador, anio=args.anio, meses=args.mes, procesos=args.procesos)
+    if any(r["error"] for r in resultados):
+        sys.exit(1)
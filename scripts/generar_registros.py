@@ -1,34 +1,25 @@
-import os
-import json
 from datetime import datetime, timedelta
 import random
-from googleapiclient.discovery import build
-from leer_calendario import cargar_credenciales, obtener_eventos_del_dia, normalizar_nombre, obtener_trabajadores_activos
-
-def calcular_horas(entrada, salida):
-    fmt = "%H:%M"
-    h1 = datetime.strptime(entrada, fmt)
-    h2 = datetime.strptime(salida, fmt)
-    return round((h2 - h1).total_seconds() / 3600, 2)
-
-def obtener_ruta_registro(nombre_archivos, fecha, trabajador_id):
-    año = fecha[:4]
-    mes = fecha[5:7]
-    carpeta = os.path.join("..", "registros", año, mes)
-    os.makedirs(carpeta, exist_ok=True)
-    return os.path.join(carpeta, f"{trabajador_id}.json")
-
-def main():
+from almacen_registros import EscritorRegistros
+from registro import calcular_horas
+from leer_calendario import obtener_servicio
+from cache_calendario import obtener_eventos_del_dia
+from instrumentacion import argumento_perfil, ejecutar
+from plantilla import normalizar_nombre, activos_por_nombre
+
+def main(offline=False):
     print("\n🕓 Generando registros recientes...")
 
-    servicio = build('calendar', 'v3', credentials=cargar_credenciales())
-    trabajadores = obtener_trabajadores_activos()
+    servicio = None if offline else obtener_servicio()
+    trabajadores = activos_por_nombre()
 
     hoy = datetime.now().date()
+    # Los tres días se guardan en un único lote al terminar
+    escritor = EscritorRegistros(conservar_firmados=True)
     for i in range(3):  # Días recientes: hoy, ayer, anteayer
         dia = hoy - timedelta(days=i)
         fecha_str = dia.strftime("%Y-%m-%d")
-        eventos = obtener_eventos_del_dia(servicio, fecha=fecha_str)
+        eventos = obtener_eventos_del_dia(servicio, fecha=fecha_str, offline=offline)
 
         registros_creados = 0
         nombres_procesados = []
@@ -47,7 +38,6 @@ def main():
                 continue
 
             id_trabajador = trabajador["id"]
-            ruta_archivo = obtener_ruta_registro("registros", fecha_str, id_trabajador)
 
             # Obtener hora de inicio y fin si están disponibles
             try:
@@ -65,10 +55,10 @@ def main():
             if dt_inicio > ahora:
                 continue  # Aún no ha empezado el turno
 
-            if os.path.exists(ruta_archivo):
-                with open(ruta_archivo, "r", encoding="utf-8") as f:
-                    registro = json.load(f)
-            else:
+            registro = escritor.leer(fecha_str, id_trabajador)
+            if registro and registro.get("firmado_por_pin"):
+                continue  # El fichaje real manda sobre el calendario
+            if not registro:
                 registro = {
                     "id": id_trabajador,
                     "nombre": trabajador["nombre"],
@@ -80,27 +70,37 @@ def main():
                 }
 
             # Añadir entrada si no existe
-            if "entrada" not in registro:
+            if not registro.get("entrada"):
                 hora_entrada = dt_inicio - timedelta(minutes=random.randint(0, 5))
                 registro["entrada"] = hora_entrada.strftime("%H:%M")
 
             # Añadir salida si ha terminado y no se había registrado
-            if dt_fin <= ahora and "salida" not in registro:
+            if dt_fin <= ahora and not registro.get("salida"):
                 hora_salida = dt_fin + timedelta(minutes=random.randint(0, 8))
                 registro["salida"] = hora_salida.strftime("%H:%M")
 
             # Calcular horas si ambas existen
-            if "entrada" in registro and "salida" in registro and "horas" not in registro:
-                registro["horas"] = f"{calcular_horas(registro['entrada'], registro['salida']):.2f}"
+            if registro.get("entrada") and registro.get("salida") and "horas" not in registro:
+                registro["horas"] = calcular_horas(registro["entrada"], registro["salida"])
 
-            with open(ruta_archivo, "w", encoding="utf-8") as f:
-                json.dump(registro, f, indent=4, ensure_ascii=False)
+            escritor.guardar(registro)
 
             registros_creados += 1
             nombres_procesados.append(trabajador["nombre"])
 
         print(f"{fecha_str}: ✅ {registros_creados} registros generados.")
 
+    escritor.confirmar()
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--offline", action="store_true", help="No consultar Google Calendar: usar solo la caché local")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    if args.profile:
+        ejecutar(main, args.profile, offline=args.offline)
+    else:
+        from cliente_registro import con_servicio
+        con_servicio("generar_registros", main, offline=args.offline)
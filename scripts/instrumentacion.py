@@ -0,0 +1,92 @@
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Trazas de tiempos por etapa, una línea JSON por tramo, en logs/trazas.jsonl.
+#   with tramo("almacen.escribir", registros=12): ...
+#   contar("calendario.peticiones")
+# Los contadores se acumulan en memoria y se escriben al terminar el proceso.
+# Solo se escriben con la variable de entorno TRAZAS=1: el quiosco y el servicio
+# están siempre en marcha y el archivo no se rota.
+RUTA_TRAZAS = Path(os.getenv("RUTA_TRAZAS", "../logs/trazas.jsonl"))
+ACTIVAS = os.getenv("TRAZAS", "0") != "0"
+
+_bloqueo = threading.Lock()
+_archivo = {"pid": None, "f": None}
+_contadores = {}
+
+def _script():
+    return Path(sys.argv[0]).name if sys.argv and sys.argv[0] else "python"
+
+def _emitir(linea):
+    linea = dict(ts=datetime.now().isoformat(timespec="milliseconds"), script=_script(), pid=os.getpid(), **linea)
+    texto = json.dumps(linea, ensure_ascii=False, default=str) + "\n"
+    with _bloqueo:
+        # Tras un fork el hijo abre su propio descriptor
+        if _archivo["pid"] != os.getpid():
+            RUTA_TRAZAS.parent.mkdir(parents=True, exist_ok=True)
+            _archivo["f"] = open(RUTA_TRAZAS, "a", encoding="utf-8", buffering=1)
+            _archivo["pid"] = os.getpid()
+        _archivo["f"].write(texto)
+
+@contextmanager
+def tramo(nombre, **atributos):
+    # Los atributos se pueden completar dentro del bloque: with tramo(...) as t: t["n"] = 3
+    if not ACTIVAS:
+        yield atributos
+        return
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield atributos
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        linea = {"tipo": "tramo", "nombre": nombre, "ms": round((time.perf_counter() - inicio) * 1000, 3)}
+        if error:
+            linea["error"] = error
+        linea.update(atributos)
+        _emitir(linea)
+
+def contar(nombre, cantidad=1):
+    if ACTIVAS:
+        with _bloqueo:
+            _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+def _volcar_contadores():
+    with _bloqueo:
+        contadores = dict(_contadores)
+        _contadores.clear()
+    for nombre, valor in sorted(contadores.items()):
+        _emitir({"tipo": "contador", "nombre": nombre, "valor": valor})
+
+atexit.register(_volcar_contadores)
+
+def argumento_perfil(parser):
+    parser.add_argument(
+        "--profile", nargs="?", const=True, default=None, metavar="ARCHIVO",
+        help="Ejecutar con cProfile y guardar las estadísticas (por defecto en logs/<script>.prof)"
+    )
+
+def ejecutar(funcion, perfil=None, *args, **kwargs):
+    # Punto de entrada de los scripts: con perfil ejecuta funcion bajo cProfile
+    if not perfil:
+        return funcion(*args, **kwargs)
+    ruta = Path(perfil) if perfil is not True else RUTA_TRAZAS.parent / f"{Path(_script()).stem}.prof"
+    perfilador = cProfile.Profile()
+    try:
+        return perfilador.runcall(funcion, *args, **kwargs)
+    finally:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        perfilador.dump_stats(ruta)
+        pstats.Stats(perfilador, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+        print(f"📊 Perfil guardado en {ruta}", file=sys.stderr)
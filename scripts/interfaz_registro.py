@@ -1,27 +1,45 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime, timedelta
-import json
-import os
-import subprocess
+from datetime import datetime
 import uuid
-import shutil
-from pathlib import Path
-
-# Rutas
-LISTADO_TRABAJADORES = '../trabajadores/listado.json'
-SCRIPT_PDF = 'generar_pdf_mensual.py'
-RUTA_REGISTROS = '../registros/preparados/'
+import threading
+from almacen_registros import borrar_rango
+from generar_pdf_mensual import generar_lote, generar_consolidados
+from cola_trabajos import ColaTrabajos, ejecutar_proceso
+from fichaje import registrar_fichaje
+from cliente_registro import con_servicio, ErrorServicio
+from plantilla import cargar_trabajadores, guardar_trabajadores, por_pin, por_nombre
+
+# Número de procesos para generar PDFs en lote (None: uno por núcleo)
+PROCESOS_PDF = None
+# Lanzar generar_registros.py en segundo plano después de cada fichaje
+SINCRONIZAR_AL_FICHAR = True
+# Editor de trabajadores: espera sin cambios antes de guardar y filas por tanda al cargar
+RETARDO_GUARDADO_MS = 1000
+FILAS_POR_TANDA = 200
+# Segundos que se espera la respuesta del servicio al fichar
+TIMEOUT_FICHAJE = 15
 
 # Funciones auxiliares
-def cargar_trabajadores():
-    with open(LISTADO_TRABAJADORES, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def guardar_trabajadores(trabajadores):
-    with open(LISTADO_TRABAJADORES, 'w', encoding='utf-8') as f:
-        json.dump(trabajadores, f, indent=4, ensure_ascii=False)
+def mostrar_progreso(activos):
+    if not activos:
+        estado_var.set("")
+        barra_progreso.stop()
+        barra_progreso.configure(mode="determinate", value=0)
+        boton_cancelar.configure(state="disabled")
+        return
+    trabajo = activos[0]
+    hechos, total = trabajo.progreso
+    pendientes = f" (+{len(activos) - 1} en cola)" if len(activos) > 1 else ""
+    estado_var.set(f"{trabajo.descripcion}{pendientes}")
+    if total:
+        barra_progreso.stop()
+        barra_progreso.configure(mode="determinate", maximum=total, value=hechos)
+    elif str(barra_progreso.cget("mode")) != "indeterminate":
+        barra_progreso.configure(mode="indeterminate")
+        barra_progreso.start(10)
+    boton_cancelar.configure(state="normal")
 
 def fichar(tipo):
     pin = pin_entry.get().strip()
@@ -29,8 +47,7 @@ def fichar(tipo):
         messagebox.showerror("Error", "Introduce el PIN")
         return
 
-    trabajadores = cargar_trabajadores()
-    trabajador = next((t for t in trabajadores if t['pin'] == pin), None)
+    trabajador = por_pin(pin)
     if not trabajador:
         nombre_var.set("PIN no válido")
         return
@@ -42,23 +59,57 @@ def fichar(tipo):
         return
 
     tipo_str = "entrada" if tipo == 'entrada' else "salida"
-
-    try:
-        subprocess.run(['python', 'generar_registros.py'], check=True)
-        messagebox.showinfo("Éxito", f"{trabajador['nombre']} ha fichado {tipo_str} correctamente")
-    except subprocess.CalledProcessError:
-        messagebox.showerror("Error", "No se pudo generar el registro")
+    nombre = f"{trabajador['nombre']} {trabajador['apellidos']}"
+    pin_entry.delete(0, tk.END)
+    nombre_var.set(f"{nombre}: registrando {tipo_str}...")
+
+    def al_terminar(estado, valor):
+        nombre_var.set(nombre)
+        if estado == "error" and isinstance(valor, TimeoutError):
+            messagebox.showerror("Error", "El servicio no ha respondido. Comprueba el registro antes de volver a fichar.")
+            return
+        if estado != "fin":
+            messagebox.showerror("Error", "No se pudo generar el registro")
+            return
+        messagebox.showinfo("Éxito", f"{trabajador['nombre']} ha fichado {tipo_str} correctamente ({valor[tipo_str]})")
+        if SINCRONIZAR_AL_FICHAR:
+            sincronizar_calendario()
+
+    # Con el servicio local en marcha, es él quien escribe en el almacén. Solo se
+    # ficha en local si no acepta la conexión: si ya ha recibido la petición y
+    # tarda, repetirla aquí podría anotar el fichaje dos veces
+    cola_fichajes.enviar(
+        f"Fichando {tipo_str}...",
+        lambda trabajo: con_servicio(
+            "fichar", lambda pin, tipo: registrar_fichaje(trabajador, tipo, pin),
+            timeout=TIMEOUT_FICHAJE, pin=pin, tipo=tipo_str
+        ),
+        al_terminar
+    )
+
+def sincronizar_calendario():
+    # La sincronización con el calendario no retrasa el fichaje
+    def al_terminar(estado, valor):
+        if estado == "error":
+            messagebox.showwarning("Aviso", "El fichaje se ha guardado, pero no se pudo sincronizar el calendario")
+
+    cola.enviar(
+        "Sincronizando calendario...",
+        lambda trabajo: con_servicio(
+            "generar_registros", lambda: ejecutar_proceso(trabajo, ['python', 'generar_registros.py'])
+        ),
+        al_terminar
+    )
 
 def generar_pdf():
     trabajador_nombre = trabajador_cb.get()
     mes = mes_cb.get()
     anio = int(anio_cb.get())
 
-    trabajadores = cargar_trabajadores()
     trabajadores_filtrados = [
-        t for t in trabajadores if t['activo']
+        t for t in cargar_trabajadores() if t['activo']
     ] if trabajador_nombre == "Todos los trabajadores" else [
-        next((t for t in trabajadores if t['nombre'] == trabajador_nombre), None)
+        por_nombre(trabajador_nombre)
     ]
 
     if not trabajadores_filtrados or None in trabajadores_filtrados:
@@ -67,21 +118,40 @@ def generar_pdf():
 
     meses = range(1, 13) if mes == "Todos los meses" else [int(mes)]
 
-    errores = []
-    for t in trabajadores_filtrados:
-        for m in meses:
-            try:
-                subprocess.run(
-                    ['python', SCRIPT_PDF, '--trabajador', str(t['id']), '--anio', str(anio), '--mes', str(m)],
-                    check=True
-                )
-            except subprocess.CalledProcessError:
-                errores.append(f"{t['nombre']} - {m:02d}/{anio}")
-
-    if errores:
-        messagebox.showwarning("Finalizado con errores", f"Se produjeron errores con: {', '.join(errores)}")
-    else:
-        messagebox.showinfo("Éxito", "Todos los PDFs se han generado correctamente.")
+    nombres = {str(t['id']): t['nombre'] for t in trabajadores_filtrados}
+    consolidado = consolidado_var.get()
+
+    def al_terminar(estado, valor):
+        if estado == "cancelado":
+            messagebox.showinfo("Cancelado", "Se ha cancelado la generación de PDFs.")
+            return
+        if estado == "error":
+            messagebox.showerror("Error", f"No se pudieron generar los PDFs: {valor}")
+            return
+        errores = [
+            f"{nombres[r['trabajador']]} - {r['mes']:02d}/{r['anio']}" if "trabajador" in r else f"{r['mes']:02d}/{r['anio']}"
+            for r in valor if r["error"]
+        ]
+        if errores:
+            messagebox.showwarning("Finalizado con errores", f"Se produjeron errores con: {', '.join(errores)}")
+        else:
+            messagebox.showinfo("Éxito", "Todos los PDFs se han generado correctamente.")
+
+    def trabajo_pdf(trabajo):
+        if consolidado:
+            resultados = generar_consolidados(
+                anio, meses, trabajadores_filtrados,
+                al_avanzar=trabajo.avanzar, cancelado=lambda: trabajo.cancelado
+            )
+        else:
+            resultados = generar_lote(
+                trabajadores_filtrados, anio, meses, procesos=PROCESOS_PDF,
+                al_avanzar=trabajo.avanzar, cancelado=lambda: trabajo.cancelado
+            )
+        trabajo.comprobar()
+        return resultados
+
+    cola.enviar(f"Generando PDFs de {anio}...", trabajo_pdf, al_terminar)
 
 def borrar_registros():
     fecha_inicio = simpledialog.askstring("Fecha inicio", "Introduce la fecha de inicio (AAAA-MM-DD):")
@@ -105,102 +175,162 @@ def borrar_registros():
     if not confirm:
         return
 
-    dias_borrados = 0
-    while inicio <= fin:
-        carpeta_dia = Path(RUTA_REGISTROS) / inicio.strftime("%Y-%m-%d")
-        if carpeta_dia.exists() and carpeta_dia.is_dir():
-            shutil.rmtree(carpeta_dia)
-            dias_borrados += 1
-        inicio += timedelta(days=1)
+    try:
+        dias_borrados = con_servicio(
+            "borrar_rango", borrar_rango, inicio=inicio.date().isoformat(), fin=fin.date().isoformat()
+        )
+    except (OSError, ErrorServicio) as e:
+        messagebox.showerror("Error", f"No se pudieron borrar los registros: {e}")
+        return
 
     messagebox.showinfo("Finalizado", f"Se han borrado los registros de {dias_borrados} días")
 
-# Interfaz
-root = tk.Tk()
-root.title("Registro Horario - Farmacia")
-root.geometry("400x600")
-
-# --- Fichar entrada/salida ---
-tk.Label(root, text="Fichar entrada/salida", font=("Arial", 12, "bold")).pack(pady=10)
-tk.Label(root, text="PIN del trabajador:").pack()
-pin_entry = tk.Entry(root, show='*')
-pin_entry.pack(pady=5)
-nombre_var = tk.StringVar()
-tk.Label(root, textvariable=nombre_var, fg="blue").pack()
-tk.Button(root, text="Fichar entrada", command=lambda: fichar('entrada')).pack(pady=2)
-tk.Button(root, text="Fichar salida", command=lambda: fichar('salida')).pack(pady=2)
-
-# --- Generar PDF mensual ---
-tk.Label(root, text="\nGenerar PDF mensual", font=("Arial", 12, "bold")).pack(pady=10)
-trabajadores = cargar_trabajadores()
-trabajador_cb = ttk.Combobox(root, values=["Todos los trabajadores"] + [t['nombre'] for t in trabajadores])
-trabajador_cb.pack(pady=5)
-
-mes_cb = ttk.Combobox(root, values=["Todos los meses"] + [str(i) for i in range(1, 13)])
-mes_cb.set(str(datetime.now().month))
-mes_cb.pack(pady=2)
-
-anio_cb = ttk.Combobox(root, values=[str(a) for a in range(2021, datetime.now().year + 1)])
-anio_cb.set(str(datetime.now().year))
-anio_cb.pack(pady=2)
-
-tk.Button(root, text="Generar PDF", command=generar_pdf).pack(pady=5)
-
 def editar_trabajadores():
+    # El listado en memoria es la referencia: las ediciones marcan la fila como
+    # pendiente y el guardado se agrupa (RETARDO_GUARDADO_MS sin cambios) y se
+    # hace en la cola de trabajos. Los PIN se comprueban contra un índice
+    # {pin: id} que se actualiza con cada edición, sin recorrer toda la tabla.
     editar = tk.Toplevel(root)
     editar.title("Editar trabajadores")
     editar.geometry("800x500")
 
-    trabajadores = cargar_trabajadores()
+    trabajadores = [dict(t) for t in cargar_trabajadores()]
+    por_id_local = {str(t["id"]): t for t in trabajadores}
+    pins = {str(t["pin"]): str(t["id"]) for t in trabajadores if t.get("pin") not in (None, "")}
+    pendientes = set()
+    estado = {"temporizador": None, "guardando": False, "carga": None, "version": 0, "escrita": 0}
+    bloqueo_escritura = threading.Lock()
+
     columnas = ("id", "nombre", "apellidos", "nif", "pin", "activo")
+    buscar_var = tk.StringVar()
+    frame_buscar = tk.Frame(editar)
+    frame_buscar.pack(fill="x", padx=10, pady=(10, 0))
+    tk.Label(frame_buscar, text="Buscar:").pack(side="left")
+    tk.Entry(frame_buscar, textvariable=buscar_var).pack(side="left", fill="x", expand=True, padx=5)
+
     tree = ttk.Treeview(editar, columns=columnas, show="headings")
     for col in columnas:
         tree.heading(col, text=col.capitalize())
         tree.column(col, width=100)
-
-    for t in trabajadores:
-        tree.insert('', 'end', values=(t['id'], t['nombre'], t['apellidos'], t['nif'], t['pin'], 'Sí' if t['activo'] else 'No'))
-
     tree.pack(expand=True, fill='both', pady=10)
 
-    def actualizar_y_guardar():
-        nuevos = []
-        pins = set()
-        for item_id in tree.get_children():
-            values = tree.item(item_id)['values']
-            trabajador = {
-                "id": str(values[0]),
-                "nombre": values[1],
-                "apellidos": values[2],
-                "nif": values[3],
-                "pin": values[4],
-                "activo": True if values[5] == 'Sí' else False
-            }
-            if trabajador['pin'] in pins:
-                messagebox.showerror("Error", f"PIN duplicado: {trabajador['pin']}")
-                return
-            pins.add(trabajador['pin'])
-            nuevos.append(trabajador)
-        guardar_trabajadores(nuevos)
+    def valores(t):
+        return (t['id'], t['nombre'], t['apellidos'], t['nif'], t.get('pin', ''), 'Sí' if t.get('activo', True) else 'No')
+
+    def cargar_filas(*_):
+        # Las filas se insertan por tandas en el bucle de Tk: la ventana se abre
+        # al momento aunque el listado tenga cientos de trabajadores
+        if estado["carga"]:
+            editar.after_cancel(estado["carga"])
+        tree.delete(*tree.get_children())
+        texto = buscar_var.get().strip().lower()
+        filas = [t for t in trabajadores if not texto or texto in " ".join(map(str, valores(t)[:5])).lower()]
+
+        def tanda(inicio):
+            for t in filas[inicio:inicio + FILAS_POR_TANDA]:
+                tree.insert('', 'end', iid=str(t['id']), values=valores(t))
+            if inicio + FILAS_POR_TANDA < len(filas):
+                estado["carga"] = editar.after(1, tanda, inicio + FILAS_POR_TANDA)
+            else:
+                estado["carga"] = None
+
+        tanda(0)
+
+    buscar_var.trace_add("write", cargar_filas)
+
+    def escribir(copia, version):
+        # Al cerrar la ventana puede coincidir con un guardado en segundo plano:
+        # nunca se escribe encima una copia más antigua que la ya guardada
+        with bloqueo_escritura:
+            if version > estado["escrita"]:
+                guardar_trabajadores(copia)
+                estado["escrita"] = version
+
+    def guardar_pendientes():
+        estado["temporizador"] = None
+        if not pendientes:
+            return
+        if estado["guardando"]:
+            programar_guardado()  # Se guarda cuando termine el guardado en curso
+            return
+        copia = [dict(t) for t in trabajadores]
+        guardados = set(pendientes)
+        pendientes.clear()
+        estado["guardando"] = True
+
+        def al_terminar(resultado, valor):
+            estado["guardando"] = False
+            if resultado == "error":
+                # Siguen pendientes: se reintenta con el próximo cambio o al cerrar
+                pendientes.update(guardados)
+                messagebox.showerror("Error", f"No se pudo guardar el listado de trabajadores: {valor}")
+
+        version = estado["version"]
+        cola.enviar("Guardando trabajadores...", lambda trabajo: escribir(copia, version), al_terminar)
+
+    def programar_guardado():
+        if estado["temporizador"]:
+            editar.after_cancel(estado["temporizador"])
+        estado["temporizador"] = editar.after(RETARDO_GUARDADO_MS, guardar_pendientes)
+
+    def marcar(trabajador):
+        pendientes.add(str(trabajador["id"]))
+        estado["version"] += 1
+        if tree.exists(str(trabajador["id"])):
+            tree.item(str(trabajador["id"]), values=valores(trabajador))
+        programar_guardado()
+
+    def cerrar():
+        # Lo pendiente se guarda ya, sin esperar al temporizador
+        for clave in ("temporizador", "carga"):
+            if estado[clave]:
+                editar.after_cancel(estado[clave])
+        if pendientes:
+            escribir([dict(t) for t in trabajadores], estado["version"])
+        editar.destroy()
+
+    editar.protocol("WM_DELETE_WINDOW", cerrar)
 
     def nuevo_trabajador():
         nuevo_id = str(uuid.uuid4())[:8]
-        nuevo_item = tree.insert('', 'end', values=(nuevo_id, "", "", "", "", 'Sí'))
-        tree.focus(nuevo_item)
-        tree.selection_set(nuevo_item)
-        tree.see(nuevo_item)
-        actualizar_y_guardar()
+        trabajador = {"id": nuevo_id, "nombre": "", "apellidos": "", "nif": "", "pin": "", "activo": True}
+        trabajadores.append(trabajador)
+        por_id_local[nuevo_id] = trabajador
+        tree.insert('', 'end', iid=nuevo_id, values=valores(trabajador))
+        tree.focus(nuevo_id)
+        tree.selection_set(nuevo_id)
+        tree.see(nuevo_id)
+        marcar(trabajador)
 
     def eliminar_trabajador():
         selected = tree.selection()
         if not selected:
             messagebox.showwarning("Aviso", "Selecciona un trabajador para eliminar")
             return
-        item = tree.item(selected[0])
-        valores = item['values']
         if messagebox.askyesno("Confirmar", "¿Estás seguro de que quieres eliminar al trabajador seleccionado?"):
-            tree.item(selected[0], values=(valores[0], valores[1], valores[2], valores[3], valores[4], 'No'))
-            actualizar_y_guardar()
+            trabajador = por_id_local[selected[0]]
+            trabajador["activo"] = False
+            marcar(trabajador)
+
+    def cambiar(trabajador, columna, valor):
+        # Devuelve False si el cambio no es válido
+        if columna == "pin":
+            valor = valor.strip()
+            duenio = pins.get(valor)
+            if valor and duenio not in (None, str(trabajador["id"])):
+                messagebox.showerror("Error", f"PIN duplicado: {valor}")
+                return False
+            if pins.get(str(trabajador.get("pin"))) == str(trabajador["id"]):
+                del pins[str(trabajador["pin"])]
+            if valor:
+                pins[valor] = str(trabajador["id"])
+        elif columna == "activo":
+            valor = valor.strip().lower() in ("sí", "si")
+        if trabajador.get(columna) == valor:
+            return True
+        trabajador[columna] = valor
+        marcar(trabajador)
+        return True
 
     def editar_celda(event):
         item = tree.identify_row(event.y)
@@ -208,16 +338,22 @@ def editar_trabajadores():
         if not item or col == '#0':
             return
         col_index = int(col[1:]) - 1
+        if columnas[col_index] == "id":
+            return  # El id enlaza los registros ya guardados
+        trabajador = por_id_local[item]
         x, y, w, h = tree.bbox(item, col)
         entry = tk.Entry(editar)
         entry.place(x=x, y=y + tree.winfo_y())
-        entry.insert(0, tree.item(item)['values'][col_index])
+        entry.insert(0, valores(trabajador)[col_index])
         entry.focus()
 
         def guardar(event):
-            tree.set(item, column=columnas[col_index], value=entry.get())
+            # Return y el FocusOut posterior llegan los dos: solo cuenta el primero
+            if not entry.winfo_exists():
+                return
+            valor = entry.get()
             entry.destroy()
-            actualizar_y_guardar()
+            cambiar(trabajador, columnas[col_index], valor)
 
         entry.bind('<Return>', guardar)
         entry.bind('<FocusOut>', guardar)
@@ -229,7 +365,56 @@ def editar_trabajadores():
     tk.Button(frame_botones, text="Añadir nuevo trabajador", command=nuevo_trabajador).pack(side="left", padx=5)
     tk.Button(frame_botones, text="Eliminar trabajador", command=eliminar_trabajador).pack(side="left", padx=5)
 
-tk.Button(root, text="Editar trabajadores", command=editar_trabajadores).pack(pady=10)
-tk.Button(root, text="Borrar registros entre fechas", command=borrar_registros).pack(pady=10)
-
-root.mainloop()
+    cargar_filas()
+
+if __name__ == "__main__":
+    # Interfaz
+    root = tk.Tk()
+    root.title("Registro Horario - Farmacia")
+    root.geometry("400x600")
+
+    # --- Fichar entrada/salida ---
+    tk.Label(root, text="Fichar entrada/salida", font=("Arial", 12, "bold")).pack(pady=10)
+    tk.Label(root, text="PIN del trabajador:").pack()
+    pin_entry = tk.Entry(root, show='*')
+    pin_entry.pack(pady=5)
+    nombre_var = tk.StringVar()
+    tk.Label(root, textvariable=nombre_var, fg="blue").pack()
+    tk.Button(root, text="Fichar entrada", command=lambda: fichar('entrada')).pack(pady=2)
+    tk.Button(root, text="Fichar salida", command=lambda: fichar('salida')).pack(pady=2)
+
+    # --- Generar PDF mensual ---
+    tk.Label(root, text="\nGenerar PDF mensual", font=("Arial", 12, "bold")).pack(pady=10)
+    trabajadores = cargar_trabajadores()
+    trabajador_cb = ttk.Combobox(root, values=["Todos los trabajadores"] + [t['nombre'] for t in trabajadores])
+    trabajador_cb.pack(pady=5)
+
+    mes_cb = ttk.Combobox(root, values=["Todos los meses"] + [str(i) for i in range(1, 13)])
+    mes_cb.set(str(datetime.now().month))
+    mes_cb.pack(pady=2)
+
+    anio_cb = ttk.Combobox(root, values=[str(a) for a in range(2021, datetime.now().year + 1)])
+    anio_cb.set(str(datetime.now().year))
+    anio_cb.pack(pady=2)
+
+    consolidado_var = tk.BooleanVar()
+    tk.Checkbutton(root, text="Un solo PDF por mes (gestoría)", variable=consolidado_var).pack()
+
+    tk.Button(root, text="Generar PDF", command=generar_pdf).pack(pady=5)
+    tk.Button(root, text="Editar trabajadores", command=editar_trabajadores).pack(pady=10)
+    tk.Button(root, text="Borrar registros entre fechas", command=borrar_registros).pack(pady=10)
+
+    # --- Trabajos en segundo plano ---
+    estado_var = tk.StringVar()
+    tk.Label(root, textvariable=estado_var, fg="gray").pack()
+    barra_progreso = ttk.Progressbar(root, length=300)
+    barra_progreso.pack(pady=2)
+    boton_cancelar = tk.Button(root, text="Cancelar", state="disabled", command=lambda: cola.cancelar_todos())
+    boton_cancelar.pack(pady=2)
+    cola = ColaTrabajos(root, al_cambiar=mostrar_progreso)
+    # Los fichajes van en su propia cola: no esperan detrás de un lote de PDFs
+    # y el quiosco sigue respondiendo aunque el almacén esté ocupado (compactando...)
+    cola_fichajes = ColaTrabajos(root, hilos=1)
+    root.protocol("WM_DELETE_WINDOW", lambda: (cola.cerrar(), cola_fichajes.cerrar(), root.destroy()))
+
+    root.mainloop()
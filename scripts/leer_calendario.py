@@ -1,12 +1,16 @@
 from __future__ import print_function
 import os
-import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import threading
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+import httplib2
 import pytz
+from instrumentacion import tramo, contar
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -18,48 +22,131 @@ GOOGLE_TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI")
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 CALENDAR_ID = os.getenv("CALENDAR_ID")
+# Un calendario de turnos por farmacia, separados por comas
+CALENDARIOS = [c.strip() for c in os.getenv("CALENDAR_IDS", CALENDAR_ID or "").split(",") if c.strip()]
 
-def cargar_credenciales():
-    creds = Credentials(
-        token=None,
-        refresh_token=GOOGLE_REFRESH_TOKEN,
-        token_uri=GOOGLE_TOKEN_URI,
-        client_id=GOOGLE_CLIENT_ID,
-        client_secret=GOOGLE_CLIENT_SECRET,
-        scopes=SCOPES
-    )
-    return build('calendar', 'v3', credentials=creds)
+TIMEOUT_HTTP = 30
+
+# Un único objeto de credenciales por proceso (el token se refresca una vez y
+# se reutiliza) y un servicio por hilo, porque httplib2.Http no es seguro entre
+# hilos. Cada servicio mantiene abiertas sus conexiones con la API.
+_credenciales = None
+_bloqueo = threading.Lock()
+_local = threading.local()
+
+def _obtener_credenciales():
+    global _credenciales
+    with _bloqueo:
+        if _credenciales is None:
+            _credenciales = Credentials(
+                token=None,
+                refresh_token=GOOGLE_REFRESH_TOKEN,
+                token_uri=GOOGLE_TOKEN_URI,
+                client_id=GOOGLE_CLIENT_ID,
+                client_secret=GOOGLE_CLIENT_SECRET,
+                scopes=SCOPES
+            )
+        return _credenciales
 
-def obtener_eventos_del_dia(servicio, fecha=None):
+def obtener_servicio():
+    servicio = getattr(_local, "servicio", None)
+    if servicio is None:
+        http = AuthorizedHttp(_obtener_credenciales(), http=httplib2.Http(timeout=TIMEOUT_HTTP))
+        # static_discovery usa el documento de descubrimiento incluido en la librería
+        servicio = build('calendar', 'v3', http=http, cache_discovery=False, static_discovery=True)
+        _local.servicio = servicio
+    return servicio
+
+def obtener_eventos_del_dia(servicio, fecha=None, calendario=None):
     if fecha is None:
         fecha = datetime.now().date().isoformat()
     zona_horaria = 'Europe/Madrid'
     tz = pytz.timezone(zona_horaria)
     inicio = tz.localize(datetime.fromisoformat(fecha))
-    fin = inicio + timedelta(days=1)
+    # Medianoche local del día siguiente: sumar a una hora ya localizada conserva
+    # el desfase y los días de cambio de hora quedarían una hora cortos o largos
+    fin = tz.localize(datetime.fromisoformat(fecha) + timedelta(days=1))
+
+    with tramo("calendario.dia", fecha=fecha) as t:
+        eventos_resultado = servicio.events().list(
+            calendarId=calendario or CALENDAR_ID,
+            timeMin=inicio.isoformat(),
+            timeMax=fin.isoformat(),
+            singleEvents=True,
+            orderBy='startTime'
+        ).execute()
+        t["eventos"] = len(eventos_resultado.get('items', []))
+    contar("calendario.peticiones")
+    return eventos_resultado.get('items', [])
 
-    eventos_resultado = servicio.events().list(
-        calendarId=CALENDAR_ID,
+def fecha_local_evento(evento, tz=None):
+    tz = tz or pytz.timezone('Europe/Madrid')
+    inicio = evento.get("start", {})
+    if "dateTime" in inicio:
+        return datetime.fromisoformat(inicio["dateTime"]).astimezone(tz).date().isoformat()
+    return inicio.get("date")
+
+def _listar_eventos(servicio, calendario=None, **parametros):
+    # Recorre todas las páginas de events().list; devuelve (eventos, nextSyncToken)
+    eventos = []
+    page_token = None
+    while True:
+        with tramo("calendario.pagina") as t:
+            eventos_resultado = servicio.events().list(
+                calendarId=calendario or CALENDAR_ID,
+                singleEvents=True,
+                maxResults=2500,
+                pageToken=page_token,
+                **parametros
+            ).execute()
+            t["eventos"] = len(eventos_resultado.get('items', []))
+        contar("calendario.peticiones")
+        eventos.extend(eventos_resultado.get('items', []))
+        page_token = eventos_resultado.get('nextPageToken')
+        if not page_token:
+            return eventos, eventos_resultado.get('nextSyncToken')
+
+def agrupar_por_dia(eventos):
+    tz = pytz.timezone('Europe/Madrid')
+    eventos_por_dia = {}
+    for evento in eventos:
+        fecha = fecha_local_evento(evento, tz)
+        if fecha:
+            eventos_por_dia.setdefault(fecha, []).append(evento)
+    for eventos_dia in eventos_por_dia.values():
+        eventos_dia.sort(key=lambda e: e["start"].get("dateTime") or e["start"].get("date"))
+    return eventos_por_dia
+
+def obtener_eventos_rango(servicio, fecha_inicio, fecha_fin, calendario=None):
+    # Una sola consulta paginada para todo el rango [fecha_inicio, fecha_fin],
+    # agrupada por fecha local de inicio del evento
+    tz = pytz.timezone('Europe/Madrid')
+    inicio = tz.localize(datetime.fromisoformat(str(fecha_inicio)))
+    fin = tz.localize(datetime.fromisoformat(str(fecha_fin)) + timedelta(days=1))
+    eventos, _ = _listar_eventos(
+        servicio,
+        calendario,
         timeMin=inicio.isoformat(),
         timeMax=fin.isoformat(),
-        singleEvents=True,
         orderBy='startTime'
-    ).execute()
-    return eventos_resultado.get('items', [])
-
-def normalizar_nombre(nombre):
-    return nombre.strip().lower().lstrip('.')
+    )
+    return agrupar_por_dia(eventos)
 
-def obtener_trabajadores_activos():
-    ruta = os.path.join("trabajadores", "listado.json")
-    with open(ruta, "r", encoding="utf-8") as file:
-        trabajadores = json.load(file)
-    activos = {}
-    for t in trabajadores:
-        if t.get("activo", True):
-            nombre_clave = normalizar_nombre(t["nombre"])
-            activos[nombre_clave] = t
-            if "alias" in t:
-                for a in t["alias"]:
-                    activos[normalizar_nombre(a)] = t
-    return activos
+def obtener_cambios(servicio, sync_token=None, fecha_inicio=None, calendario=None, fecha_fin=None):
+    # Sin token: listado completo desde fecha_inicio (hasta fecha_fin incluida, si se
+    # indica). Con token: solo los eventos modificados o cancelados desde la última
+    # sincronización.
+    # Devuelve (eventos, nuevo_token), o (None, None) si el token ha caducado.
+    if sync_token:
+        try:
+            return _listar_eventos(servicio, calendario, syncToken=sync_token)
+        except HttpError as e:
+            if e.resp.status == 410:
+                return None, None
+            raise
+    tz = pytz.timezone('Europe/Madrid')
+    inicio = tz.localize(datetime.fromisoformat(str(fecha_inicio)))
+    limites = {"timeMin": inicio.isoformat()}
+    if fecha_fin is not None:
+        limites["timeMax"] = tz.localize(datetime.fromisoformat(str(fecha_fin)) + timedelta(days=1)).isoformat()
+    return _listar_eventos(servicio, calendario, **limites)
@@ -0,0 +1,69 @@
+import os
+import json
+import threading
+from pathlib import Path
+
+# Listado de trabajadores compartido por todos los scripts.
+# Se lee una sola vez y se vuelve a leer solo si cambia la fecha de
+# modificación, el tamaño o el inodo de listado.json (un os.replace con el
+# mismo tamaño en el mismo tic del reloj solo cambia el inodo). Las búsquedas por PIN, id y
+# nombre/alias usan diccionarios construidos en cada recarga.
+RUTA_TRABAJADORES = Path("../trabajadores/listado.json")
+
+_cache = {"firma": None}
+_bloqueo = threading.Lock()
+
+def normalizar_nombre(nombre):
+    return nombre.strip().lower().lstrip('.')
+
+def _alias(trabajador):
+    alias = trabajador.get("alias") or []
+    return [alias] if isinstance(alias, str) else alias
+
+def _firma():
+    estado = os.stat(RUTA_TRABAJADORES)
+    return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+def _indexar(trabajadores):
+    por_pin, por_id, por_nombre, activos = {}, {}, {}, {}
+    for t in trabajadores:
+        por_id[str(t["id"])] = t
+        if t.get("pin") not in (None, ""):
+            por_pin[str(t["pin"])] = t
+        for nombre in [t["nombre"]] + _alias(t):
+            clave = normalizar_nombre(nombre)
+            por_nombre[clave] = t
+            if t.get("activo", True):
+                activos[clave] = t
+    return {"por_pin": por_pin, "por_id": por_id, "por_nombre": por_nombre, "activos": activos}
+
+def _actual():
+    firma = _firma()
+    with _bloqueo:
+        if _cache["firma"] != firma:
+            with open(RUTA_TRABAJADORES, "r", encoding="utf-8") as f:
+                trabajadores = json.load(f)
+            _cache.update(_indexar(trabajadores), trabajadores=trabajadores, firma=firma)
+        return _cache
+
+def cargar_trabajadores():
+    return list(_actual()["trabajadores"])
+
+def guardar_trabajadores(trabajadores):
+    temporal = RUTA_TRABAJADORES.with_suffix(".tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(trabajadores, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, RUTA_TRABAJADORES)
+
+def por_pin(pin):
+    return _actual()["por_pin"].get(str(pin).strip())
+
+def por_id(trabajador_id):
+    return _actual()["por_id"].get(str(trabajador_id))
+
+def por_nombre(nombre):
+    return _actual()["por_nombre"].get(normalizar_nombre(nombre))
+
+def activos_por_nombre():
+    # {nombre o alias normalizado: trabajador} solo con los trabajadores activos
+    return _actual()["activos"]
@@ -4,118 +4,269 @@ import random
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from pathlib import Path
-from leer_calendario import cargar_credenciales, obtener_eventos_del_dia, normalizar_nombre
-from googleapiclient.discovery import build
+import almacen_registros
+from leer_calendario import (
+    obtener_servicio, obtener_cambios, agrupar_por_dia, fecha_local_evento
+)
+import cache_calendario
+from instrumentacion import tramo, argumento_perfil, ejecutar
+from registro import calcular_horas, minutos
+from plantilla import normalizar_nombre, activos_por_nombre
 
-RUTA_REGISTROS = Path("../registros/preparados/")
-LISTADO_TRABAJADORES = Path("../trabajadores/listado.json")
+RUTA_CHECKPOINT = Path("../registros/sincronizacion.json")
+# Minutos (negativos: antes) que se añaden al inicio y al fin del evento
+MARGEN_ENTRADA = (-5, -1)
+MARGEN_SALIDA = (1, 8)
 
-def cargar_trabajadores():
-    with open(LISTADO_TRABAJADORES, "r", encoding="utf-8") as f:
+def cargar_checkpoint():
+    if not RUTA_CHECKPOINT.exists():
+        return None
+    with open(RUTA_CHECKPOINT, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def guardar_registro(nombre_archivo, registro):
-    RUTA_REGISTROS.mkdir(parents=True, exist_ok=True)
-    carpeta = RUTA_REGISTROS / registro["fecha"]
-    carpeta.mkdir(parents=True, exist_ok=True)
-    ruta = carpeta / f"{registro['id']}.json"
-    with open(ruta, "w", encoding="utf-8") as f:
-        json.dump(registro, f, indent=4, ensure_ascii=False)
-
-def calcular_horas(entrada, salida):
-    h1, m1 = map(int, entrada.split(":"))
-    h2, m2 = map(int, salida.split(":"))
-    inicio = timedelta(hours=h1, minutes=m1)
-    fin = timedelta(hours=h2, minutes=m2)
-    return round((fin - inicio).total_seconds() / 3600, 2)
-
-def main():
-    servicio = build("calendar", "v3", credentials=cargar_credenciales())
-    trabajadores = cargar_trabajadores()
-    trabajadores_dict = {normalizar_nombre(t.get("alias") or t["nombre"]): t for t in trabajadores if t["activo"]}
+def guardar_checkpoint(checkpoint):
+    temporal = RUTA_CHECKPOINT.with_suffix(".tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=4, ensure_ascii=False)
+    os.replace(temporal, RUTA_CHECKPOINT)
+
+def borrar_registro(fecha, trabajador_id, escritor=None):
+    # Nunca se borra un fichaje firmado con PIN
+    if escritor is None:
+        with almacen_registros.EscritorRegistros() as escritor:
+            return borrar_registro(fecha, trabajador_id, escritor)
+    registro = escritor.leer(fecha, trabajador_id)
+    if not registro or registro.get("firmado_por_pin"):
+        return False
+    return escritor.borrar(fecha, trabajador_id)
+
+def trabajador_del_evento(evento, trabajadores_dict):
+    resumen = evento.get("summary", "")
+    if " - " not in resumen:
+        return None
+    nombre_raw, turno = resumen.split(" - ", 1)
+    return trabajadores_dict.get(normalizar_nombre(nombre_raw))
+
+def indexar_eventos(indice, eventos, trabajadores_dict):
+    # id de evento -> [fecha, id del trabajador], para saber qué registro tocar
+    # cuando el calendario solo devuelve el id de un evento cancelado
+    for evento in eventos:
+        if evento.get("status") == "cancelled":
+            indice.pop(evento["id"], None)
+            continue
+        trabajador = trabajador_del_evento(evento, trabajadores_dict)
+        indice[evento["id"]] = [fecha_local_evento(evento), trabajador["id"] if trabajador else None]
+    return indice
+
+def hora_con_margen(dt, margen, anterior=""):
+    # Hora a unos minutos al azar de dt. Si la anterior ya cae en el margen (o
+    # justo en dt, como las de generar_registros) el evento no ha cambiado y se
+    # conserva: así una reconstrucción completa no reescribe todo el almacén
+    if anterior:
+        diferencia = (minutos(anterior) - minutos(dt.strftime("%H:%M")) + 720) % 1440 - 720
+        if min(margen[0], 0) <= diferencia <= max(margen[1], 0):
+            return anterior
+    return (dt + timedelta(minutes=random.randint(*margen))).strftime("%H:%M")
+
+def registros_del_dia(fecha_str, eventos, trabajadores_dict, ids_generados, escritor=None):
+    # Con escritor se conservan las horas sin firmar de los eventos que no han cambiado
+    registros = []
+    for evento in eventos:
+        resumen = evento.get("summary", "")
+        if " - " not in resumen:
+            continue
+
+        nombre_raw, turno = resumen.split(" - ", 1)
+        nombre_normalizado = normalizar_nombre(nombre_raw)
+
+        trabajador = trabajadores_dict.get(nombre_normalizado)
+        if not trabajador:
+            print(f"{fecha_str}: ⚠️  Trabajador no encontrado o inactivo para evento '{resumen}' (analizado como '{nombre_normalizado}')")
+            continue
+
+        inicio = evento.get("start", {}).get("dateTime")
+        fin = evento.get("end", {}).get("dateTime")
+
+        if not inicio or not fin:
+            print(f"{fecha_str}: ⚠️  Evento sin hora definida: '{resumen}'")
+            continue
+
+        dt_inicio = datetime.fromisoformat(inicio)
+        dt_fin = datetime.fromisoformat(fin)
+        ahora = datetime.now(dt_inicio.tzinfo)
+
+        if dt_inicio > ahora:
+            continue  # no registrar eventos futuros
+
+        # Evitar duplicados por día/trabajador
+        fecha_dia = dt_inicio.date().isoformat()
+        id_trabajador = trabajador["id"]
+        if ids_generados.get((fecha_dia, id_trabajador)):
+            continue
+        ids_generados[(fecha_dia, id_trabajador)] = True
+
+        existente = (escritor.leer(fecha_dia, id_trabajador) if escritor else None) or {}
+        hora_entrada = hora_con_margen(dt_inicio, MARGEN_ENTRADA, existente.get("entrada"))
+        hora_salida = hora_con_margen(dt_fin, MARGEN_SALIDA, existente.get("salida"))
+
+        # Si aún no ha terminado el turno, no registrar salida
+        if dt_fin > ahora:
+            hora_salida = ""
+
+        horas = calcular_horas(hora_entrada, hora_salida) if hora_salida else None
+
+        registro = {
+            "id": trabajador["id"],
+            "nombre": trabajador["nombre"],
+            "apellidos": trabajador["apellidos"],
+            "nif": trabajador["nif"],
+            "fecha": fecha_dia,
+            "entrada": hora_entrada,
+            "salida": hora_salida,
+            "estado": "trabajado",
+            "firmado_por_pin": False,
+            "pin_usado": None,
+            "timestamp_firma": None,
+        }
+
+        if horas is not None:
+            registro["horas"] = round(horas, 2)
+
+        registros.append(registro)
+    return registros
+
+def reconstruir_completo(servicio, trabajadores_dict, hoy, offline=False):
     ids_generados = {}
 
-    hoy = datetime.now().date()
     fecha_inicio = hoy - relativedelta(months=50)
     fecha_actual = fecha_inicio
 
+    if offline:
+        eventos, sync_token = [], None
+        eventos_por_dia = cache_calendario.obtener_eventos_rango(servicio, fecha_inicio, hoy, offline=True)
+    else:
+        # El listado completo devuelve también el syncToken para las ejecuciones incrementales.
+        # Termina hoy: los turnos futuros no se registran ni se indexan
+        eventos, sync_token = obtener_cambios(servicio, fecha_inicio=fecha_inicio, fecha_fin=hoy)
+        eventos_por_dia = agrupar_por_dia(eventos)
+        cache_calendario.guardar({f: eventos_por_dia.get(f, []) for f in cache_calendario.fechas_entre(fecha_inicio, hoy)})
+
+    # Toda la reconstrucción es un solo lote: cada segmento mensual se escribe una vez
+    escritor = almacen_registros.EscritorRegistros(conservar_firmados=True)
     while fecha_actual <= hoy:
         fecha_str = fecha_actual.strftime("%Y-%m-%d")
-        eventos = obtener_eventos_del_dia(servicio, fecha_str)
+        eventos_dia = eventos_por_dia.get(fecha_str, [])
 
-        if not eventos:
+        if not eventos_dia:
             print(f"{fecha_str}: ⚠️  No hay eventos en el calendario.")
             print(f"{fecha_str}: ✅ 0 registros generados.")
             fecha_actual += timedelta(days=1)
             continue
 
-        generados_hoy = 0
+        registros = registros_del_dia(fecha_str, eventos_dia, trabajadores_dict, ids_generados, escritor)
+        with tramo("reconstruir.guardar", fecha=fecha_str) as t:
+            escritor.guardar_varios(registros)
+            t["registros"] = len(registros)
 
-        for evento in eventos:
-            resumen = evento.get("summary", "")
-            if " - " not in resumen:
-                continue
+        print(f"{fecha_str}: ✅ {len(registros)} registros generados.")
+        fecha_actual += timedelta(days=1)
+    with tramo("reconstruir.confirmar"):
+        escritor.confirmar()
 
-            nombre_raw, turno = resumen.split(" - ", 1)
-            nombre_normalizado = normalizar_nombre(nombre_raw)
+    return {
+        "ultima_fecha": (hoy - timedelta(days=1)).isoformat(),
+        "sync_token": sync_token,
+        "eventos": indexar_eventos({}, eventos, trabajadores_dict),
+    }
 
-            trabajador = trabajadores_dict.get(nombre_normalizado)
-            if not trabajador:
-                print(f"{fecha_str}: ⚠️  Trabajador no encontrado o inactivo para evento '{resumen}' (analizado como '{nombre_normalizado}')")
-                continue
+def reconstruir_incremental(servicio, trabajadores_dict, hoy, checkpoint, cambios, sync_token):
+    indice = checkpoint.get("eventos", {})
 
-            inicio = evento.get("start", {}).get("dateTime")
-            fin = evento.get("end", {}).get("dateTime")
+    # Registros afectados: la posición anterior y la nueva de cada evento modificado
+    afectados = set()
+    for evento in cambios:
+        anterior = indice.get(evento["id"])
+        if anterior and anterior[1]:
+            afectados.add(tuple(anterior))
+    indexar_eventos(indice, cambios, trabajadores_dict)
+    for evento in cambios:
+        actual = indice.get(evento["id"])
+        if actual and actual[1]:
+            afectados.add(tuple(actual))
 
-            if not inicio or not fin:
-                print(f"{fecha_str}: ⚠️  Evento sin hora definida: '{resumen}'")
-                continue
+    # Los días sin conciliar se regeneran enteros; de los anteriores solo se
+    # vuelven a leer los días con cambios
+    desde = (datetime.fromisoformat(checkpoint["ultima_fecha"]).date() + timedelta(days=1)).isoformat()
+    cache_calendario.invalidar({f for f, _ in afectados})
+    eventos_por_dia = cache_calendario.obtener_eventos_rango(servicio, desde, hoy)
+    for fecha in sorted({f for f, _ in afectados if f < desde}):
+        eventos_por_dia[fecha] = cache_calendario.obtener_eventos_del_dia(servicio, fecha)
 
-            dt_inicio = datetime.fromisoformat(inicio)
-            dt_fin = datetime.fromisoformat(fin)
-            ahora = datetime.now(dt_inicio.tzinfo)
+    ids_generados = {}
+    escritor = almacen_registros.EscritorRegistros(conservar_firmados=True)
+    for fecha_str in sorted(eventos_por_dia):
+        if fecha_str > hoy.isoformat():
+            continue
+        registros = [
+            registro for registro in registros_del_dia(fecha_str, eventos_por_dia[fecha_str], trabajadores_dict, ids_generados, escritor)
+            if fecha_str >= desde or (registro["fecha"], registro["id"]) in afectados
+        ]
+        with tramo("reconstruir.guardar", fecha=fecha_str) as t:
+            escritor.guardar_varios(registros)
+            t["registros"] = len(registros)
+        print(f"{fecha_str}: ✅ {len(registros)} registros generados.")
 
-            if dt_inicio > ahora:
-                continue  # no registrar eventos futuros
+    # Registros cuyo evento se ha cancelado o movido a otro día/trabajador
+    for fecha, trabajador_id in sorted(afectados):
+        if (fecha, trabajador_id) not in ids_generados and borrar_registro(fecha, trabajador_id, escritor):
+            print(f"{fecha}: 🗑️  Registro del trabajador {trabajador_id} eliminado.")
+    with tramo("reconstruir.confirmar"):
+        escritor.confirmar()
 
-            hora_entrada = (dt_inicio - timedelta(minutes=random.randint(1, 5))).strftime("%H:%M")
-            hora_salida = (dt_fin + timedelta(minutes=random.randint(1, 8))).strftime("%H:%M")
+    return {
+        "ultima_fecha": (hoy - timedelta(days=1)).isoformat(),
+        "sync_token": sync_token,
+        "eventos": indice,
+    }
 
-            # Si aún no ha terminado el turno, no registrar salida
-            if dt_fin > ahora:
-                hora_salida = ""
+def main(incremental=False, offline=False):
+    trabajadores_dict = activos_por_nombre()
+    hoy = datetime.now().date()
 
-            # Evitar duplicados por día/trabajador
-            fecha_dia = dt_inicio.date().isoformat()
-            id_trabajador = trabajador["id"]
-            if ids_generados.get((fecha_dia, id_trabajador)):
-                continue
-            ids_generados[(fecha_dia, id_trabajador)] = True
+    if offline:
+        # Sin conexión solo se puede reconstruir a partir de la caché, y no se toca el punto de control
+        reconstruir_completo(None, trabajadores_dict, hoy, offline=True)
+        return
 
-            horas = calcular_horas(hora_entrada, hora_salida) if hora_salida else None
+    servicio = obtener_servicio()
 
-            registro = {
-                "id": trabajador["id"],
-                "nombre": trabajador["nombre"],
-                "apellidos": trabajador["apellidos"],
-                "nif": trabajador["nif"],
-                "fecha": fecha_dia,
-                "entrada": hora_entrada,
-                "salida": hora_salida,
-                "estado": "trabajado",
-                "firmado_por_pin": False,
-                "pin_usado": None,
-                "timestamp_firma": None,
-            }
+    checkpoint = cargar_checkpoint() if incremental else None
+    if incremental and not checkpoint:
+        print("⚠️  No hay punto de control previo, se hace una reconstrucción completa.")
 
-            if horas is not None:
-                registro["horas"] = round(horas, 2)
+    if checkpoint:
+        cambios, sync_token = obtener_cambios(servicio, checkpoint["sync_token"])
+        if cambios is None:
+            print("⚠️  El token de sincronización ha caducado, se hace una reconstrucción completa.")
+            checkpoint = None
 
-            guardar_registro(f"{trabajador['id']}.json", registro)
-            generados_hoy += 1
+    if checkpoint:
+        print(f"🔄 {len(cambios)} eventos modificados desde {checkpoint['ultima_fecha']}.")
+        checkpoint = reconstruir_incremental(servicio, trabajadores_dict, hoy, checkpoint, cambios, sync_token)
+    else:
+        checkpoint = reconstruir_completo(servicio, trabajadores_dict, hoy)
 
-        print(f"{fecha_str}: ✅ {generados_hoy} registros generados.")
-        fecha_actual += timedelta(days=1)
+    guardar_checkpoint(checkpoint)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="Regenerar solo los días pendientes y los eventos modificados desde la última ejecución")
+    parser.add_argument("--offline", action="store_true", help="No consultar Google Calendar: usar solo la caché local")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    if args.profile:
+        ejecutar(main, args.profile, incremental=args.incremental, offline=args.offline)
+    else:
+        from cliente_registro import con_servicio
+        con_servicio("reconstruir", main, incremental=args.incremental, offline=args.offline)
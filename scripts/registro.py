@@ -0,0 +1,187 @@
+import sys
+from datetime import date
+
+# Registro de un día de un trabajador con las fechas y horas ya convertidas:
+# el día como ordinal y la entrada y la salida en minutos desde las 00:00.
+# Se convierte una sola vez al leer (Registro.desde_dict) y a_dict lo devuelve
+# al esquema JSON del almacén. Con __slots__ y los textos repetidos (nombre,
+# NIF, estado) internados ocupa bastante menos que el dict equivalente.
+# Las conversiones de texto se guardan en diccionarios: en un año hay unas
+# pocas miles de fechas y horas distintas repetidas en todos los registros.
+# Una hora o unas horas mal escritas ("25:99", "9h", "8,00") no impiden leer
+# el registro: quedan sin convertir y se conservan tal cual en otros, así que
+# a_dict las devuelve como estaban y texto() las muestra como están guardadas
+# (verificar las señala para corregirlas).
+_minutos = {}
+_del_dia = {}
+_ordinales = {}
+_fechas = {}
+_CONOCIDOS = frozenset((
+    "id", "nombre", "apellidos", "nif", "fecha", "entrada", "salida", "horas", "estado", "firmado_por_pin",
+))
+
+def minutos(hora, defecto=None):
+    # "HH:MM" -> minutos desde las 00:00; defecto si falta
+    if not hora:
+        return defecto
+    try:
+        return _minutos[hora]
+    except KeyError:
+        pass
+    if len(hora) == 5 and hora[2] == ":":
+        valor = int(hora[:2]) * 60 + int(hora[3:])
+    else:
+        h, m = hora.split(":")
+        valor = int(h) * 60 + int(m)
+    _minutos[hora] = valor
+    return valor
+
+def _minutos_del_dia(texto):
+    # Como minutos(), pero con ValueError si no es una hora del día ("25:99", "9h"...)
+    try:
+        return _del_dia[texto]
+    except (KeyError, TypeError):
+        pass
+    valor = minutos(texto)
+    if valor is not None and not (valor < 24 * 60 and texto[-3:-2] == ":" and texto[-2:] < "60"):
+        raise ValueError(f"Hora no válida: {texto!r}")
+    _del_dia[texto] = valor
+    return valor
+
+def _horas_o_none(horas):
+    return None if horas in (None, "") else horas_a_float(horas)
+
+def _convertir(d, campo, conversion, otros):
+    # conversion(d[campo]) o, si no se puede, None dejando el valor guardado en otros
+    valor = d.get(campo)
+    try:
+        return conversion(valor)
+    except (ValueError, TypeError):
+        otros[campo] = valor
+        return None
+
+def hora(minutos):
+    return "" if minutos is None else f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def ordinal(fecha):
+    # "AAAA-MM-DD" -> date.toordinal()
+    try:
+        return _ordinales[fecha]
+    except KeyError:
+        valor = date(int(fecha[:4]), int(fecha[5:7]), int(fecha[8:10])).toordinal()
+        _ordinales[fecha] = valor
+        return valor
+
+def fecha_iso(dia):
+    try:
+        return _fechas[dia]
+    except KeyError:
+        valor = _fechas[dia] = date.fromordinal(dia).isoformat()
+        return valor
+
+def duracion(entrada, salida):
+    # Minutos entre entrada y salida (en minutos); un turno que pasa de medianoche suma 24 h
+    if entrada is None or salida is None:
+        return None
+    return salida - entrada if salida >= entrada else salida + 24 * 60 - entrada
+
+def calcular_horas(entrada, salida):
+    # Horas con dos decimales entre dos horas "HH:MM"
+    return round(duracion(minutos(entrada), minutos(salida)) / 60, 2)
+
+def horas_a_float(horas):
+    # Admite 7.5, "7.50" y "7:30"
+    if horas in (None, ""):
+        return 0.0
+    if isinstance(horas, (int, float)):
+        return float(horas)
+    if ":" in horas:
+        h, m = horas.split(":")
+        return int(h) + int(m) / 60
+    return float(horas)
+
+class Registro:
+    __slots__ = ("id", "nombre", "apellidos", "nif", "dia", "entrada", "salida", "horas", "estado", "firmado", "otros")
+
+    def __init__(self, id, dia, entrada=None, salida=None, horas=None, estado="trabajado", firmado=False,
+                 nombre="", apellidos="", nif="", otros=None):
+        self.id = sys.intern(str(id))
+        self.dia = dia
+        self.entrada = entrada
+        self.salida = salida
+        self.horas = horas
+        self.estado = sys.intern(estado)
+        self.firmado = firmado
+        self.nombre = sys.intern(nombre)
+        self.apellidos = sys.intern(apellidos)
+        self.nif = sys.intern(nif)
+        # Campos del esquema sin atributo propio (pin_usado, timestamp_firma...) o None
+        self.otros = otros
+
+    @classmethod
+    def desde_dict(cls, d):
+        r = cls.__new__(cls)
+        r.id = sys.intern(str(d["id"]))
+        r.nombre = sys.intern(d.get("nombre") or "")
+        r.apellidos = sys.intern(d.get("apellidos") or "")
+        r.nif = sys.intern(d.get("nif") or "")
+        r.dia = ordinal(d["fecha"])
+        otros = {k: v for k, v in d.items() if k not in _CONOCIDOS}
+        r.entrada = _convertir(d, "entrada", _minutos_del_dia, otros)
+        r.salida = _convertir(d, "salida", _minutos_del_dia, otros)
+        r.horas = _convertir(d, "horas", _horas_o_none, otros)
+        r.estado = sys.intern(d.get("estado") or "")
+        r.firmado = bool(d.get("firmado_por_pin"))
+        r.otros = otros or None
+        return r
+
+    @property
+    def fecha(self):
+        return fecha_iso(self.dia)
+
+    def fecha_date(self):
+        return date.fromordinal(self.dia)
+
+    def duracion(self):
+        return duracion(self.entrada, self.salida)
+
+    def texto(self, campo):
+        # entrada, salida ("HH:MM") u horas (dos decimales) para mostrar; el valor
+        # guardado tal cual si no se pudo convertir
+        if self.otros and campo in self.otros:
+            return str(self.otros[campo])
+        if campo == "horas":
+            return "" if self.horas is None else f"{self.horas:.2f}"
+        return hora(getattr(self, campo))
+
+    def horas_trabajadas(self):
+        # Las guardadas o, si faltan, las de entrada y salida
+        if self.horas is not None:
+            return self.horas
+        minutos = self.duracion()
+        return 0.0 if minutos is None else round(minutos / 60, 2)
+
+    def a_dict(self):
+        d = {
+            "id": self.id,
+            "nombre": self.nombre,
+            "apellidos": self.apellidos,
+            "nif": self.nif,
+            "fecha": self.fecha,
+            "entrada": hora(self.entrada),
+            "salida": hora(self.salida),
+        }
+        if self.horas is not None:
+            d["horas"] = round(self.horas, 2)
+        d["estado"] = self.estado
+        d["firmado_por_pin"] = self.firmado
+        if self.otros:
+            d.update(self.otros)
+        return d
+
+    def __repr__(self):
+        return f"Registro({self.id!r}, {self.fecha}, {hora(self.entrada)}-{hora(self.salida)}, {self.estado!r})"
+
+def desde_mes(por_trabajador):
+    # {id: [dict]} -> {id: [Registro]}
+    return {i: [Registro.desde_dict(r) for r in lista] for i, lista in por_trabajador.items()}
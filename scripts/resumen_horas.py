@@ -0,0 +1,36 @@
+from almacen_registros import totales_del_mes
+from plantilla import por_id
+from instrumentacion import argumento_perfil, ejecutar
+
+# Resumen de horas por trabajador y mes a partir de los totales guardados
+# en la cabecera de cada segmento mensual (no recorre los registros).
+def resumen(anio, meses, trabajadores=None):
+    filas = []
+    for mes in meses:
+        for trabajador_id, totales in sorted(totales_del_mes(anio, mes).items(), key=lambda t: str(t[0])):
+            if trabajadores and str(trabajador_id) not in trabajadores:
+                continue
+            filas.append({"trabajador": str(trabajador_id), "anio": anio, "mes": mes, **totales})
+    return filas
+
+def imprimir(filas):
+    if not filas:
+        print("⚠️ No hay registros para el periodo indicado.")
+        return
+    print(f"{'Mes':<8} {'Trabajador':<30} {'Horas':>8} {'Extra':>7} {'Días':>5} {'Sin salida':>11}")
+    for f in filas:
+        trabajador = por_id(f["trabajador"])
+        nombre = f"{trabajador['nombre']} {trabajador['apellidos']}" if trabajador else f"ID {f['trabajador']}"
+        print(f"{f['mes']:02d}/{f['anio']:<5} {nombre[:30]:<30} {f['horas']:>8.2f} {f['extras']:>7.2f} {f['dias']:>5} {f['sin_salida']:>11}")
+    print(f"{'Total':<39} {sum(f['horas'] for f in filas):>8.2f} {sum(f['extras'] for f in filas):>7.2f} "
+          f"{sum(f['dias'] for f in filas):>5} {sum(f['sin_salida'] for f in filas):>11}")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--anio", type=int, required=True)
+    parser.add_argument("--mes", type=int, nargs="+", default=list(range(1, 13)))
+    parser.add_argument("--trabajador", nargs="+", help="ID del trabajador (o varios); por defecto todos")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    imprimir(ejecutar(resumen, args.profile, args.anio, args.mes, args.trabajador))
@@ -0,0 +1,167 @@
+import io
+import os
+import sys
+import hmac
+import json
+import secrets
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import plantilla
+from almacen_registros import borrar_rango
+from fichaje import fichar_por_pin
+from generar_pdf_mensual import generar_lote, generar_consolidados
+from leer_calendario import obtener_servicio
+from instrumentacion import tramo
+import generar_registros
+import reconstruir_registros
+import sincronizar_calendarios
+from consultar import registros_entre
+from cliente_registro import HOST, PUERTO, RUTA_TOKEN, CABECERA_TOKEN
+
+# Servicio local que mantiene cargados el listado de trabajadores, el cliente de
+# Google Calendar y los módulos de PDF, para que la interfaz y los scripts no
+# paguen el arranque en cada acción. Escucha solo en 127.0.0.1:
+#   POST /<operacion> con los parámetros en JSON
+#   -> {"ok": true, "resultado": ..., "salida": "lo impreso"} o {"ok": false, "error": ...}
+# Solo se atienden peticiones JSON con el token de RUTA_TOKEN y sin cabecera
+# Origin: una página web abierta en el mismo equipo no puede borrar registros.
+# Las operaciones largas se ejecutan en HILOS hilos fijos (así cada uno reutiliza
+# su cliente de Calendar); las rápidas, como fichar, en el hilo de la petición
+# para no esperar detrás de una sincronización. Las escrituras no necesitan
+# turno propio: el cerrojo del diario ya las ordena y cada lote solo anota lo
+# que ha cambiado, sin sustituir fichajes firmados con PIN.
+HILOS = 2
+
+# operación: (función, se ejecuta en los hilos fijos)
+OPERACIONES = {
+    "estado": (lambda: {"pid": os.getpid(), "operaciones": sorted(OPERACIONES)}, False),
+    "fichar": (fichar_por_pin, False),
+    "generar_registros": (generar_registros.main, True),
+    "reconstruir": (reconstruir_registros.main, True),
+    "sincronizar": (sincronizar_calendarios.sincronizar_resumen, True),
+    "borrar_rango": (borrar_rango, False),
+    "pdf": (generar_lote, True),
+    "pdf_consolidado": (generar_consolidados, True),
+    "consultar": (registros_entre, False),
+}
+
+_local = threading.local()
+_pool = ThreadPoolExecutor(max_workers=HILOS)
+_token = {"valor": None}
+
+class _SalidaPorHilo:
+    # Copia lo que imprime cada operación para devolverlo al cliente
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, texto):
+        captura = getattr(_local, "salida", None)
+        if captura is not None:
+            captura.write(texto)
+        return self.original.write(texto)
+
+    def flush(self):
+        self.original.flush()
+
+def _ejecutar(operacion, parametros):
+    funcion = OPERACIONES[operacion][0]
+    _local.salida = io.StringIO()
+    try:
+        with tramo(f"servicio.{operacion}"):
+            resultado = funcion(**parametros)
+        return resultado, _local.salida.getvalue()
+    finally:
+        _local.salida = None
+
+def _crear_token():
+    # Token nuevo en cada arranque, en un fichero que solo puede leer este usuario
+    token = secrets.token_hex(32)
+    RUTA_TOKEN.parent.mkdir(parents=True, exist_ok=True)
+    temporal = RUTA_TOKEN.with_suffix(".tmp")
+    if temporal.exists():
+        temporal.unlink()
+    descriptor = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(temporal, RUTA_TOKEN)
+    return token
+
+def _calentar():
+    plantilla.cargar_trabajadores()
+    try:
+        obtener_servicio()
+    except Exception as e:
+        print(f"⚠️ No se pudo preparar el cliente de Google Calendar: {e}")
+
+class _Manejador(BaseHTTPRequestHandler):
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _rechazar(self):
+        # Motivo para rechazar la petición o None si es válida
+        if self.headers.get("Origin") is not None:
+            return 403, "No se admiten peticiones desde el navegador"
+        if self.headers.get_content_type() != "application/json":
+            return 415, "Las peticiones deben ser JSON"
+        token = self.headers.get(CABECERA_TOKEN) or ""
+        if not hmac.compare_digest(token.encode("utf-8"), _token["valor"].encode("utf-8")):
+            return 403, "Token no válido"
+        return None
+
+    def do_POST(self):
+        rechazo = self._rechazar()
+        if rechazo:
+            self._responder(rechazo[0], {"ok": False, "error": rechazo[1]})
+            return
+        operacion = self.path.strip("/")
+        if operacion not in OPERACIONES:
+            self._responder(404, {"ok": False, "error": f"Operación desconocida: {operacion}"})
+            return
+        longitud = int(self.headers.get("Content-Length", 0))
+        parametros = json.loads(self.rfile.read(longitud) or b"{}")
+        try:
+            if OPERACIONES[operacion][1]:
+                resultado, salida = _pool.submit(_ejecutar, operacion, parametros).result()
+            else:
+                resultado, salida = _ejecutar(operacion, parametros)
+        except Exception as e:
+            self._responder(500, {"ok": False, "error": str(e), "tipo": type(e).__name__})
+            return
+        self._responder(200, {"ok": True, "resultado": resultado, "salida": salida})
+
+    def log_message(self, formato, *args):
+        print(f"📡 {self.address_string()} {formato % args}")
+
+def servir(host=HOST, puerto=PUERTO):
+    _pool.submit(_calentar)
+    servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    _token["valor"] = _crear_token()
+    servidor.daemon_threads = True
+    print(f"🚀 Servicio de registro escuchando en http://{host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        RUTA_TOKEN.unlink(missing_ok=True)
+        _pool.shutdown(wait=True)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    args = parser.parse_args()
+    # Los PDFs en lote crean procesos desde un servidor con varios hilos: con fork
+    # podrían heredar un bloqueo tomado por otro hilo
+    if os.name != "nt":
+        multiprocessing.set_start_method("forkserver")
+    sys.stdout = _SalidaPorHilo(sys.stdout)
+    servir(puerto=args.puerto)
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+import almacen_registros
+from leer_calendario import CALENDARIOS, obtener_servicio, obtener_eventos_rango
+from plantilla import activos_por_nombre
+from reconstruir_registros import registros_del_dia
+from registro import calcular_horas
+from instrumentacion import tramo, argumento_perfil, ejecutar
+
+# Sincroniza varios calendarios de turnos (uno por farmacia) a la vez.
+# Cada calendario se descarga en un hilo con su propio servicio; todas las
+# peticiones pasan por un limitador de cubo de fichas compartido y se
+# reintentan con espera exponencial ante 429/5xx. La fusión en el almacén
+# de registros se hace después, en el hilo principal.
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+class LimitadorTasa:
+    # Hasta `capacidad` peticiones seguidas y `tasa` peticiones/segundo sostenidas
+    def __init__(self, tasa, capacidad=None):
+        self.tasa = tasa
+        self.capacidad = capacidad or max(1, tasa)
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._bloqueo = threading.Lock()
+
+    def esperar(self):
+        while True:
+            with self._bloqueo:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.tasa
+            time.sleep(espera)
+
+def ejecutar_con_reintentos(peticion, limitador, intentos=5, espera_base=1.0):
+    for intento in range(intentos):
+        limitador.esperar()
+        try:
+            return peticion.execute()
+        except HttpError as e:
+            if e.resp.status not in CODIGOS_REINTENTABLES or intento == intentos - 1:
+                raise
+        except OSError:
+            if intento == intentos - 1:
+                raise
+        time.sleep(espera_base * 2 ** intento + random.uniform(0, espera_base))
+
+class _PeticionLimitada:
+    def __init__(self, peticion, limitador):
+        self._peticion = peticion
+        self._limitador = limitador
+
+    def execute(self):
+        return ejecutar_con_reintentos(self._peticion, self._limitador)
+
+class _EventosLimitados:
+    def __init__(self, eventos, limitador):
+        self._eventos = eventos
+        self._limitador = limitador
+
+    def list(self, **parametros):
+        return _PeticionLimitada(self._eventos.list(**parametros), self._limitador)
+
+class ServicioLimitado:
+    # Envuelve un servicio de Calendar para que events().list(...).execute()
+    # respete el limitador y reintente
+    def __init__(self, servicio, limitador):
+        self._servicio = servicio
+        self._limitador = limitador
+
+    def events(self):
+        return _EventosLimitados(self._servicio.events(), self._limitador)
+
+def descargar_calendarios(calendarios, fecha_inicio, fecha_fin, hilos=4, tasa=5.0, crear_servicio=obtener_servicio):
+    # {calendario: {fecha: eventos}} y {calendario: error} para los que fallen
+    limitador = LimitadorTasa(tasa)
+
+    def descargar(calendario):
+        servicio = ServicioLimitado(crear_servicio(), limitador)
+        with tramo("sincronizar.calendario", calendario=calendario):
+            return obtener_eventos_rango(servicio, fecha_inicio, fecha_fin, calendario=calendario)
+
+    resultados, errores = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(hilos, len(calendarios)))) as pool:
+        futuros = {pool.submit(descargar, calendario): calendario for calendario in calendarios}
+        for futuro in as_completed(futuros):
+            calendario = futuros[futuro]
+            try:
+                resultados[calendario] = futuro.result()
+            except Exception as e:
+                errores[calendario] = e
+    return resultados, errores
+
+def fusionar(eventos_por_calendario, fecha_inicio, fecha_fin):
+    # Igual que generar_registros: no se cambia una entrada ya registrada ni un
+    # fichaje firmado; solo se completa la salida cuando el turno ha terminado
+    trabajadores_dict = activos_por_nombre()
+    ids_generados = {}
+    nuevos = []
+    escritor = almacen_registros.EscritorRegistros(conservar_firmados=True)
+    dia = fecha_inicio
+    while dia <= fecha_fin:
+        fecha_str = dia.isoformat()
+        eventos_dia = [e for cal in sorted(eventos_por_calendario) for e in eventos_por_calendario[cal].get(fecha_str, [])]
+        for registro in registros_del_dia(fecha_str, eventos_dia, trabajadores_dict, ids_generados):
+            existente = escritor.leer(registro["fecha"], registro["id"])
+            if existente and (existente.get("firmado_por_pin") or existente.get("salida") or not registro["salida"]):
+                continue
+            if existente and existente.get("entrada"):
+                registro["entrada"] = existente["entrada"]
+                registro.pop("horas", None)
+                if registro["salida"]:
+                    registro["horas"] = calcular_horas(registro["entrada"], registro["salida"])
+            escritor.guardar(registro)
+            nuevos.append(registro)
+        dia += timedelta(days=1)
+    escritor.confirmar()
+    return nuevos
+
+def sincronizar(calendarios=None, dias=3, hilos=4, tasa=5.0, crear_servicio=obtener_servicio):
+    calendarios = calendarios or CALENDARIOS
+    hoy = datetime.now().date()
+    fecha_inicio = hoy - timedelta(days=dias - 1)
+
+    print(f"\n🕓 Sincronizando {len(calendarios)} calendarios ({fecha_inicio} - {hoy})...")
+    eventos_por_calendario, errores = descargar_calendarios(calendarios, fecha_inicio, hoy, hilos, tasa, crear_servicio)
+    for calendario, eventos_por_dia in sorted(eventos_por_calendario.items()):
+        print(f"📅 {calendario}: {sum(len(e) for e in eventos_por_dia.values())} eventos")
+    for calendario, error in sorted(errores.items()):
+        print(f"❌ {calendario}: {error}")
+
+    nuevos = fusionar(eventos_por_calendario, fecha_inicio, hoy)
+    print(f"✅ {len(nuevos)} registros generados o actualizados.")
+    return nuevos, errores
+
+def sincronizar_resumen(calendarios=None, dias=3, hilos=4, tasa=5.0):
+    # Versión serializable en JSON para el servicio local y su cliente
+    nuevos, errores = sincronizar(calendarios, dias, hilos, tasa)
+    return {"nuevos": len(nuevos), "errores": {c: str(e) for c, e in errores.items()}}
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calendario", nargs="+", help="IDs de calendario (por defecto CALENDAR_IDS del .env)")
+    parser.add_argument("--dias", type=int, default=3, help="Días hacia atrás, incluido hoy")
+    parser.add_argument("--hilos", type=int, default=4)
+    parser.add_argument("--tasa", type=float, default=5.0, help="Peticiones por segundo como máximo")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    if args.profile:
+        _, errores = ejecutar(sincronizar, args.profile, args.calendario, args.dias, args.hilos, args.tasa)
+    else:
+        from cliente_registro import con_servicio
+        errores = con_servicio(
+            "sincronizar", sincronizar_resumen,
+            calendarios=args.calendario, dias=args.dias, hilos=args.hilos, tasa=args.tasa
+        )["errores"]
+    if errores:
+        sys.exit(1)
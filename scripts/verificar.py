@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import date
+from almacen_registros import EscritorRegistros, cargar_mes, meses_guardados
+from registro import calcular_horas, horas_a_float
+from diario_registros import cerrojo
+from instrumentacion import tramo, argumento_perfil, ejecutar
+
+# Comprobación de todo el almacén, un mes por tarea en un ProcessPoolExecutor.
+# Cada registro se contrasta con el esquema y los problemas se clasifican por
+# tipo. Con reparar=True se corrige lo que tiene arreglo seguro y se reescribe
+# el mes (cada mes lo escribe un único proceso). El formato canónico de horas
+# es un número con dos decimales, igual que escriben fichaje y reconstruir_registros.
+CAMPOS_OBLIGATORIOS = ("id", "nombre", "fecha", "estado")
+FORMATO_HORA = re.compile(r"^\d{1,2}:[0-5]\d$")
+TOLERANCIA_HORAS = 0.02
+
+# Tipos de problema que reparar corrige
+REPARABLES = {"horas_formato", "horas_incoherentes", "horas_sin_salida", "horas_falta", "duplicado"}
+
+def revisar_registro(registro, anio, mes, hoy):
+    # Lista de (tipo, detalle) del registro
+    problemas = []
+    faltan = [c for c in CAMPOS_OBLIGATORIOS if registro.get(c) in (None, "")]
+    if faltan:
+        problemas.append(("campo_falta", ", ".join(faltan)))
+
+    fecha = str(registro.get("fecha", ""))
+    try:
+        if (date.fromisoformat(fecha).year, date.fromisoformat(fecha).month) != (anio, mes):
+            problemas.append(("fecha_fuera_de_mes", fecha))
+    except ValueError:
+        problemas.append(("fecha_invalida", fecha))
+
+    entrada, salida = registro.get("entrada") or "", registro.get("salida") or ""
+    horas_validas = True
+    for campo, valor in (("entrada", entrada), ("salida", salida)):
+        if valor and not FORMATO_HORA.match(valor):
+            problemas.append(("hora_invalida", f"{campo}={valor}"))
+            horas_validas = False
+
+    if registro.get("estado") == "trabajado" and entrada and not salida and fecha < hoy:
+        problemas.append(("sin_salida", fecha))
+
+    horas = registro.get("horas")
+    if horas not in (None, ""):
+        try:
+            valor = horas_a_float(horas)
+        except ValueError:
+            problemas.append(("horas_invalidas", repr(horas)))
+            return problemas
+        if not isinstance(horas, (int, float)):
+            problemas.append(("horas_formato", repr(horas)))
+        if not salida:
+            problemas.append(("horas_sin_salida", repr(horas)))
+        elif entrada and horas_validas and abs(valor - calcular_horas(entrada, salida)) > TOLERANCIA_HORAS:
+            problemas.append(("horas_incoherentes", f"{valor} en lugar de {calcular_horas(entrada, salida)}"))
+    elif entrada and salida and horas_validas:
+        problemas.append(("horas_falta", ""))
+
+    if registro.get("firmado_por_pin") and not (registro.get("pin_usado") and registro.get("timestamp_firma")):
+        problemas.append(("firma_incompleta", ""))
+    return problemas
+
+def _reparar(registro, tipos):
+    if "horas_sin_salida" in tipos:
+        registro.pop("horas", None)
+    elif {"horas_incoherentes", "horas_falta"} & tipos:
+        registro["horas"] = calcular_horas(registro["entrada"], registro["salida"])
+    elif "horas_formato" in tipos:
+        registro["horas"] = round(horas_a_float(registro["horas"]), 2)
+
+def verificar_mes(anio, mes, reparar=False, hoy=None):
+    # Devuelve {"anio", "mes", "registros", "problemas": [...], "reparados"}
+    hoy = hoy or date.today().isoformat()
+    # Al reparar, el mes se lee y se reescribe dentro del cerrojo del diario para
+    # no deshacer un fichaje anotado entre medias
+    with (cerrojo() if reparar else nullcontext()), tramo("verificar.mes", mes=f"{anio}-{mes:02d}") as t:
+        por_trabajador = cargar_mes(anio, mes)
+        problemas = []
+        reparados = 0
+        total = 0
+        for trabajador_id, registros in por_trabajador.items():
+            vistos = {}
+            for registro in registros:
+                total += 1
+                encontrados = revisar_registro(registro, anio, mes, hoy)
+                fecha = registro.get("fecha")
+                if fecha in vistos:
+                    encontrados.append(("duplicado", fecha))
+                vistos.setdefault(fecha, []).append(registro)
+                for tipo, detalle in encontrados:
+                    problemas.append({"fecha": fecha, "trabajador": str(trabajador_id), "tipo": tipo, "detalle": detalle})
+                tipos = {tipo for tipo, _ in encontrados}
+                if reparar and tipos & REPARABLES:
+                    _reparar(registro, tipos)
+                    reparados += 1
+            if reparar and any(len(v) > 1 for v in vistos.values()):
+                # De los duplicados se queda el firmado con PIN o, si no hay, el último
+                por_trabajador[trabajador_id] = [
+                    next((r for r in reversed(v) if r.get("firmado_por_pin")), v[-1]) for v in vistos.values()
+                ]
+        if reparar and reparados:
+            with EscritorRegistros() as escritor:
+                escritor.reemplazar_mes(anio, mes, por_trabajador)
+        t.update(registros=total, problemas=len(problemas), reparados=reparados)
+    return {"anio": anio, "mes": mes, "registros": total, "problemas": problemas, "reparados": reparados}
+
+def verificar(reparar=False, procesos=None, anio=None):
+    meses = [(a, m) for a, m in meses_guardados() if anio is None or a == anio]
+    if procesos is None:
+        procesos = min(len(meses), os.cpu_count() or 1)
+    hoy = date.today().isoformat()
+    if procesos <= 1:
+        return [verificar_mes(a, m, reparar, hoy) for a, m in meses]
+    resultados = []
+    # Sin fork, como en generar_pdf_mensual.generar_lote: un hijo no hereda bloqueos de otros hilos
+    contexto = multiprocessing.get_context("spawn" if os.name == "nt" else "forkserver")
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        futuros = [pool.submit(verificar_mes, a, m, reparar, hoy) for a, m in meses]
+        for futuro in as_completed(futuros):
+            resultados.append(futuro.result())
+    resultados.sort(key=lambda r: (r["anio"], r["mes"]))
+    return resultados
+
+def imprimir(resultados, ejemplos=5):
+    problemas = [p for r in resultados for p in r["problemas"]]
+    total = sum(r["registros"] for r in resultados)
+    reparados = sum(r["reparados"] for r in resultados)
+    print(f"🔎 {total} registros en {len(resultados)} meses.")
+    if not problemas:
+        print("✅ No se han encontrado problemas.")
+        return
+    for tipo, cantidad in Counter(p["tipo"] for p in problemas).most_common():
+        marca = "🔧" if tipo in REPARABLES else "⚠️"
+        print(f"{marca} {tipo}: {cantidad}")
+        for p in [p for p in problemas if p["tipo"] == tipo][:ejemplos]:
+            print(f"     {p['fecha']} trabajador {p['trabajador']} {p['detalle']}")
+    if reparados:
+        print(f"🔧 {reparados} registros reparados.")
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reparar", action="store_true", help="Corregir los problemas que tienen arreglo seguro")
+    parser.add_argument("--procesos", type=int, default=None, help="Número de procesos en paralelo")
+    parser.add_argument("--anio", type=int, help="Solo este año")
+    parser.add_argument("--json", action="store_true", help="Imprimir todos los problemas en JSON")
+    argumento_perfil(parser)
+    args = parser.parse_args()
+    resultados = ejecutar(verificar, args.profile, args.reparar, args.procesos, args.anio)
+    if args.json:
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+    else:
+        imprimir(resultados)
+    # Sale con error si quedan problemas, para poder encadenarlo antes de generar PDFs
+    pendientes = [p for r in resultados for p in r["problemas"] if not (args.reparar and p["tipo"] in REPARABLES)]
+    if pendientes:
+        sys.exit(1)
@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Los scripts usan rutas relativas ("../registros", "../trabajadores"...): cada
+# prueba se ejecuta desde <tmp>/scripts dentro de un árbol vacío.
+RAIZ = Path(__file__).resolve().parent.parent
+os.environ["TRAZAS"] = "0"
+os.environ["REGISTRO_SERVICIO"] = "0"
+sys.path.insert(0, str(RAIZ / "scripts"))
+sys.path.insert(0, str(RAIZ))
+
+LISTADO = [
+    {"id": "1", "nombre": "Ana", "apellidos": "Pérez", "nif": "1X", "alias": "Ana", "pin": "1111", "activo": True},
+    {"id": "2", "nombre": "Luis", "apellidos": "Gómez", "nif": "2X", "alias": "Luis", "pin": "2222", "activo": True},
+]
+
+@pytest.fixture
+def arbol(tmp_path, monkeypatch):
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "registros").mkdir()
+    (tmp_path / "trabajadores").mkdir()
+    with open(tmp_path / "trabajadores" / "listado.json", "w", encoding="utf-8") as f:
+        json.dump(LISTADO, f, ensure_ascii=False)
+    monkeypatch.chdir(tmp_path / "scripts")
+    import consultar
+    consultar._cache.clear()
+    return tmp_path
+
+def registro(trabajador_id, fecha, entrada="09:00", salida="17:00", **extra):
+    r = {"id": str(trabajador_id), "nombre": "Ana", "apellidos": "Pérez", "nif": "1X", "fecha": fecha,
+         "entrada": entrada, "salida": salida, "estado": "trabajado", "firmado_por_pin": False}
+    r.update(extra)
+    return r
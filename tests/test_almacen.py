@@ -0,0 +1,92 @@
+import json
+from datetime import date
+
+import almacen_registros
+from conftest import registro
+
+def _escribir_legado(raiz, registros):
+    for r in registros:
+        carpeta = raiz / "registros" / "preparados" / r["fecha"]
+        carpeta.mkdir(parents=True, exist_ok=True)
+        with open(carpeta / f"{r['id']}.json", "w", encoding="utf-8") as f:
+            json.dump(r, f)
+
+def test_migrar_y_borrar_origen_conserva_los_registros(arbol):
+    legado = [registro(1, "2024-03-01"), registro(2, "2024-03-01"), registro(1, "2024-04-02")]
+    _escribir_legado(arbol, legado)
+
+    almacen_registros.migrar(borrar_origen=True)
+
+    assert not (arbol / "registros" / "preparados").exists()
+    assert almacen_registros.ruta_segmento(2024, 3).exists()
+    assert almacen_registros.ruta_segmento(2024, 4).exists()
+    marzo = almacen_registros.cargar_mes(2024, 3)
+    assert sorted(r["id"] for lista in marzo.values() for r in lista) == ["1", "2"]
+    assert almacen_registros.leer_registro("2024-04-02", "1")["entrada"] == "09:00"
+
+def test_migrar_no_sustituye_lo_ya_guardado(arbol):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="08:00"))
+    almacen_registros.compactar()
+    _escribir_legado(arbol, [registro(1, "2024-03-01"), registro(2, "2024-03-01")])
+
+    almacen_registros.migrar(borrar_origen=True)
+
+    assert almacen_registros.leer_registro("2024-03-01", "1")["entrada"] == "08:00"
+    assert almacen_registros.leer_registro("2024-03-01", "2") is not None
+
+def _por_dia(por_trabajador):
+    return sorted((r["id"], r["fecha"], r["entrada"]) for lista in por_trabajador.values() for r in lista)
+
+def test_archivar_y_leer_del_archivo(arbol):
+    almacen_registros.guardar_registros([
+        registro(1, "2020-03-02"), registro(2, "2020-03-02", entrada="08:00"), registro(1, "2020-11-30"),
+    ])
+    antes = _por_dia(almacen_registros.cargar_mes(2020, 3))
+
+    assert almacen_registros.archivar(2020)
+
+    assert almacen_registros.ruta_archivo(2020).exists()
+    assert not almacen_registros.ruta_segmento(2020, 3).exists()
+    assert almacen_registros.diario_registros.pendientes() == 0
+    assert _por_dia(almacen_registros.cargar_mes(2020, 3)) == antes
+    assert [r["entrada"] for r in almacen_registros.leer_registros("2", 2020, 3)] == ["08:00"]
+    assert [r["fecha"] for r in almacen_registros.leer_registros("1", 2020, 11)] == ["2020-11-30"]
+    assert almacen_registros.meses_guardados() == [(2020, 3), (2020, 11)]
+
+def test_escribir_en_un_mes_archivado(arbol):
+    almacen_registros.guardar_registros([registro(1, "2020-03-02"), registro(2, "2020-03-02")])
+    almacen_registros.archivar(2020)
+
+    almacen_registros.guardar_registro(registro(1, "2020-03-03", entrada="10:00"))
+    almacen_registros.borrar_registro("2020-03-02", "2")
+    assert _por_dia(almacen_registros.cargar_mes(2020, 3)) == [("1", "2020-03-02", "09:00"), ("1", "2020-03-03", "10:00")]
+
+    # Al compactar, el mes vuelve a tener segmento suelto con lo archivado y lo nuevo
+    almacen_registros.compactar()
+    assert almacen_registros.ruta_segmento(2020, 3).exists()
+    assert _por_dia(almacen_registros.cargar_mes(2020, 3)) == [("1", "2020-03-02", "09:00"), ("1", "2020-03-03", "10:00")]
+
+    # Y al archivar de nuevo se sustituye el miembro del archivo
+    almacen_registros.archivar(2020)
+    assert not almacen_registros.ruta_segmento(2020, 3).exists()
+    assert [r["fecha"] for r in almacen_registros.leer_registros("1", 2020, 3)] == ["2020-03-02", "2020-03-03"]
+    assert almacen_registros.leer_registros("2", 2020, 3) == []
+
+def test_purgar_en_el_limite_de_retencion(arbol):
+    almacen_registros.guardar_registros([registro(1, "2020-12-31"), registro(1, "2021-01-01")])
+    almacen_registros.archivar(2020)
+    # Un año con operaciones aún en el diario también se purga
+    almacen_registros.guardar_registro(registro(2, "2019-06-01"))
+
+    hoy = date(2025, 1, 1)
+    assert almacen_registros.purgar(retencion=almacen_registros.RETENCION_ANIOS, hoy=hoy) == [2019, 2020]
+
+    assert not almacen_registros.ruta_archivo(2020).exists()
+    assert almacen_registros.meses_guardados() == [(2021, 1)]
+    assert almacen_registros.leer_registro("2021-01-01", "1") is not None
+    assert almacen_registros.leer_registro("2020-12-31", "1") is None
+    assert almacen_registros.leer_registro("2019-06-01", "2") is None
+    # Un día antes del cambio de año 2020 aún está dentro del plazo
+    almacen_registros.guardar_registro(registro(1, "2020-12-31"))
+    assert almacen_registros.purgar(hoy=date(2024, 12, 31)) == []
+    assert almacen_registros.leer_registro("2020-12-31", "1") is not None
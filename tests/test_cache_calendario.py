@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import cache_calendario
+from benchmarks.calendario_falso import ServicioFalso
+from conftest import LISTADO
+
+@pytest.fixture
+def reloj(arbol, monkeypatch):
+    # time.time() de la caché, que la prueba adelanta a mano
+    reloj = SimpleNamespace(ahora=datetime(2024, 6, 10, 12).timestamp())
+    monkeypatch.setattr(cache_calendario, "time", SimpleNamespace(time=lambda: reloj.ahora))
+    return reloj
+
+def _evento(nombre):
+    return [{"id": nombre, "summary": f"{nombre} - Turno"}]
+
+def test_los_dias_recientes_caducan(reloj):
+    cache_calendario.guardar({"2024-06-10": _evento("Ana")})
+    reloj.ahora += cache_calendario.TTL_RECIENTES - 1
+    assert cache_calendario.leer(["2024-06-10"]) == {"2024-06-10": _evento("Ana")}
+
+    reloj.ahora += 2
+    assert cache_calendario.leer(["2024-06-10"]) == {}
+    # Sin conexión se devuelve igualmente lo guardado
+    assert cache_calendario.leer(["2024-06-10"], offline=True) == {"2024-06-10": _evento("Ana")}
+
+def test_un_dia_guardado_cuando_era_reciente_tambien_caduca(reloj):
+    # El 1 de junio se guardó el día 1; diez días después ya es antiguo, pero lo
+    # guardado entonces pudo cambiar y no se da por bueno
+    reloj.ahora = datetime(2024, 6, 1, 12).timestamp()
+    cache_calendario.guardar({"2024-06-01": _evento("Ana")})
+    reloj.ahora = datetime(2024, 6, 11, 12).timestamp()
+    assert cache_calendario.leer(["2024-06-01"]) == {}
+
+    # Guardado ya fuera de DIAS_PERMANENTES no caduca
+    cache_calendario.guardar({"2024-06-01": _evento("Luis")})
+    reloj.ahora += 365 * 24 * 3600
+    assert cache_calendario.leer(["2024-06-01"]) == {"2024-06-01": _evento("Luis")}
+
+def test_cada_calendario_tiene_sus_entradas(reloj):
+    cache_calendario.guardar({"2024-05-01": _evento("Ana")})
+    cache_calendario.guardar({"2024-05-01": _evento("Luis")}, calendario="otro@example.com")
+
+    assert cache_calendario.leer(["2024-05-01"]) == {"2024-05-01": _evento("Ana")}
+    assert cache_calendario.leer(["2024-05-01"], calendario="otro@example.com") == {"2024-05-01": _evento("Luis")}
+    cache_calendario.invalidar(["2024-05-01"], calendario="otro@example.com")
+    assert cache_calendario.leer(["2024-05-01"]) == {"2024-05-01": _evento("Ana")}
+
+def test_expulsa_las_entradas_menos_usadas(reloj, monkeypatch):
+    monkeypatch.setattr(cache_calendario, "MAX_ENTRADAS", 3)
+    for dia in ("2024-05-01", "2024-05-02", "2024-05-03"):
+        reloj.ahora += 1
+        cache_calendario.guardar({dia: _evento(dia)})
+    reloj.ahora += 1
+    cache_calendario.leer(["2024-05-01"])
+
+    reloj.ahora += 1
+    cache_calendario.guardar({"2024-05-04": _evento("2024-05-04")})
+
+    dias = ["2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04"]
+    assert sorted(cache_calendario.leer(dias, offline=True)) == ["2024-05-01", "2024-05-03", "2024-05-04"]
+
+def test_sin_conexion_repite_lo_descargado(reloj, capsys):
+    servicio = ServicioFalso(LISTADO)
+    inicio, fin = date(2024, 5, 1), date(2024, 5, 31)
+    descargados = cache_calendario.obtener_eventos_rango(servicio, inicio, fin)
+    peticiones = servicio.peticiones
+
+    reloj.ahora += 30 * 24 * 3600
+    assert cache_calendario.obtener_eventos_rango(None, inicio, fin, offline=True) == descargados
+    assert cache_calendario.obtener_eventos_del_dia(None, "2024-05-02", offline=True) == descargados.get("2024-05-02", [])
+    assert cache_calendario.obtener_eventos_rango(None, fin, fin + timedelta(days=2), offline=True) == {
+        f: e for f, e in descargados.items() if f == fin.isoformat()
+    }
+    assert "2 días sin datos" in capsys.readouterr().out
+    assert servicio.peticiones == peticiones
@@ -0,0 +1,62 @@
+import leer_calendario
+
+class CalendarioPaginado:
+    # events().list(...).execute() sobre una lista fija de eventos, en páginas de `tamano`
+    def __init__(self, eventos, tamano):
+        self.eventos = eventos
+        self.tamano = tamano
+        self.peticiones = []
+
+    def events(self):
+        return self
+
+    def list(self, **parametros):
+        self.peticiones.append(parametros)
+        return self
+
+    def execute(self):
+        inicio = int(self.peticiones[-1].get("pageToken") or 0)
+        respuesta = {"items": self.eventos[inicio:inicio + self.tamano]}
+        if inicio + self.tamano < len(self.eventos):
+            respuesta["nextPageToken"] = str(inicio + self.tamano)
+        return respuesta
+
+def _evento(id, inicio):
+    clave = "dateTime" if "T" in inicio else "date"
+    return {"id": id, "summary": "Ana - Mañana", "start": {clave: inicio}}
+
+def test_rango_recorre_todas_las_paginas():
+    eventos = [_evento(f"e{dia}", f"2024-03-{dia:02d}T09:00:00+01:00") for dia in range(1, 32)]
+    servicio = CalendarioPaginado(eventos, tamano=7)
+
+    por_dia = leer_calendario.obtener_eventos_rango(servicio, "2024-03-01", "2024-03-31")
+
+    assert len(servicio.peticiones) == 5
+    assert [p.get("pageToken") for p in servicio.peticiones] == [None, "7", "14", "21", "28"]
+    assert servicio.peticiones[0]["timeMin"] == "2024-03-01T00:00:00+01:00"
+    # El 31 de marzo cambia la hora: el rango acaba a medianoche en horario de verano
+    assert servicio.peticiones[0]["timeMax"] == "2024-04-01T00:00:00+02:00"
+    assert sorted(por_dia) == [f"2024-03-{dia:02d}" for dia in range(1, 32)]
+    assert sum(len(e) for e in por_dia.values()) == 31
+
+def test_agrupa_por_fecha_local_de_inicio():
+    eventos = [
+        _evento("todo_el_dia", "2024-03-01"),
+        _evento("medianoche", "2024-03-01T23:30:00Z"),  # 00:30 del día 2 en Madrid
+        _evento("manana", "2024-03-02T08:00:00+01:00"),
+        {"id": "cancelado", "status": "cancelled"},
+    ]
+
+    por_dia = leer_calendario.obtener_eventos_rango(CalendarioPaginado(eventos, 2), "2024-03-01", "2024-03-02")
+
+    assert [e["id"] for e in por_dia["2024-03-01"]] == ["todo_el_dia"]
+    assert [e["id"] for e in por_dia["2024-03-02"]] == ["medianoche", "manana"]
+    assert set(por_dia) == {"2024-03-01", "2024-03-02"}
+
+def test_dia_con_cambio_de_hora():
+    servicio = CalendarioPaginado([], 10)
+
+    leer_calendario.obtener_eventos_del_dia(servicio, "2024-10-27")
+
+    assert servicio.peticiones[0]["timeMin"] == "2024-10-27T00:00:00+02:00"
+    assert servicio.peticiones[0]["timeMax"] == "2024-10-28T00:00:00+01:00"
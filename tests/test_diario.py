@@ -0,0 +1,39 @@
+import diario_registros
+import almacen_registros
+from conftest import registro
+
+def test_anotar_recorta_una_linea_a_medias(arbol):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01"))
+    with open(diario_registros.RUTA_DIARIO, "ab") as f:
+        f.write(b'{"op":"guardar","registro":{"id":"2"')  # Corte de luz a mitad de línea
+
+    almacen_registros.guardar_registro(registro(2, "2024-03-02"))
+
+    assert almacen_registros.leer_registro("2024-03-01", "1") is not None
+    assert almacen_registros.leer_registro("2024-03-02", "2") is not None
+    assert diario_registros.RUTA_DIARIO.read_bytes().endswith(b"\n")
+    assert diario_registros.pendientes() == 2
+
+def _con_escritor_a_la_vez(monkeypatch, funcion):
+    # Entre la lectura del diario y la del segmento, otro escritor anota un cambio y se compacta
+    original = getattr(almacen_registros, funcion)
+
+    def intercalada(*args, **kwargs):
+        monkeypatch.setattr(almacen_registros, funcion, original)
+        almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="09:00"))
+        almacen_registros.compactar()
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(almacen_registros, funcion, intercalada)
+
+def test_cargar_mes_con_compactacion_a_la_vez(arbol, monkeypatch):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="08:00"))
+    _con_escritor_a_la_vez(monkeypatch, "_cargar_segmento")
+
+    assert almacen_registros.cargar_mes(2024, 3)["1"][0]["entrada"] == "09:00"
+
+def test_leer_registros_con_compactacion_a_la_vez(arbol, monkeypatch):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="08:00"))
+    _con_escritor_a_la_vez(monkeypatch, "_leer_bloque")
+
+    assert almacen_registros.leer_registros("1", 2024, 3)[0]["entrada"] == "09:00"
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import almacen_registros
+from conftest import LISTADO, registro
+from fichaje import registrar_fichaje
+
+ANA = LISTADO[0]
+
+def test_salida_sobre_registro_del_calendario_no_firma_su_entrada(arbol):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="08:57", salida="17:03"))
+
+    r = registrar_fichaje(ANA, "salida", "1111", ahora=datetime(2024, 3, 1, 17, 30))
+
+    assert r["firmado_por_pin"] and r["salida"] == "17:30"
+    assert r["entrada"] == "" and "horas" not in r
+    assert almacen_registros.leer_registro("2024-03-01", "1")["entrada"] == ""
+
+def test_entrada_y_salida_firmadas(arbol):
+    almacen_registros.guardar_registro(registro(1, "2024-03-01", entrada="08:57", salida="17:03"))
+
+    registrar_fichaje(ANA, "entrada", "1111", ahora=datetime(2024, 3, 1, 9, 0))
+    registrar_fichaje(ANA, "entrada", "1111", ahora=datetime(2024, 3, 1, 9, 5))
+    r = registrar_fichaje(ANA, "salida", "1111", ahora=datetime(2024, 3, 1, 17, 30))
+
+    assert (r["entrada"], r["salida"], r["horas"]) == ("09:00", "17:30", 8.5)
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import almacen_registros
+import generar_pdf_mensual
+from conftest import registro
+
+def test_consolidado_con_un_trabajador_anotado_durante_la_generacion(arbol, monkeypatch):
+    almacen_registros.guardar_registros([registro(1, "2024-03-01", horas=8.0)])
+    # El primer registro del mes de Luis llega después de leer totales_del_mes,
+    # mientras se lee el bloque de Ana
+    leer_registros = generar_pdf_mensual.leer_registros
+    def leer_con_fichaje(trabajador_id, anio, mes):
+        if not almacen_registros.leer_registros("2", anio, mes):
+            almacen_registros.guardar_registro(registro(2, "2024-03-04", salida="13:00", horas=4.0))
+        return leer_registros(trabajador_id, anio, mes)
+    monkeypatch.setattr(generar_pdf_mensual, "leer_registros", leer_con_fichaje)
+    secciones = {}
+    seccion_trabajador = generar_pdf_mensual._seccion_trabajador
+    def anotar_totales(pdf, trabajador, anio, mes, registros_mes, totales):
+        secciones[trabajador["id"]] = totales
+        return seccion_trabajador(pdf, trabajador, anio, mes, registros_mes, totales)
+    monkeypatch.setattr(generar_pdf_mensual, "_seccion_trabajador", anotar_totales)
+
+    archivo = generar_pdf_mensual.generar_pdf_consolidado(2024, 3)
+
+    assert archivo and Path(archivo).exists()
+    assert secciones["1"]["horas"] == 8.0
+    assert secciones["2"]["horas"] == 4.0
+
+def test_pdf_con_horas_mal_escritas(arbol, monkeypatch):
+    almacen_registros.guardar_registros([
+        registro(1, "2024-03-01", horas=8.0), registro(1, "2024-03-04", entrada="9h", salida="25:99", horas="8,00"),
+    ])
+    filas = []
+    celda = generar_pdf_mensual.PDF.cell
+    def anotar_celda(pdf, ancho, alto=0, texto="", *args, **kwargs):
+        filas.append(texto)
+        return celda(pdf, ancho, alto, texto, *args, **kwargs)
+    monkeypatch.setattr(generar_pdf_mensual.PDF, "cell", anotar_celda)
+
+    archivo = generar_pdf_mensual.generar_pdf("1", 2024, 3)
+
+    assert archivo and Path(archivo).exists()
+    fila = filas.index("04-03-2024 (L)")
+    assert filas[fila + 1:fila + 6] == ["9h", "", "25:99", "", "8,00"]
+    assert "Total horas trabajadas: 8.0 h" in filas
@@ -0,0 +1,21 @@
+import json
+import os
+
+import plantilla
+from conftest import LISTADO
+
+def test_recarga_si_se_sustituye_el_listado_sin_cambiar_fecha_ni_tamano(arbol):
+    ruta = arbol / "trabajadores" / "listado.json"
+    assert plantilla.por_pin("1111")["nombre"] == "Ana"
+    antes = os.stat(ruta)
+
+    # Mismo tamaño y misma fecha de modificación: solo cambia el inodo
+    temporal = ruta.with_suffix(".tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump([{**LISTADO[0], "pin": "9999"}, LISTADO[1]], f, ensure_ascii=False)
+    os.utime(temporal, ns=(antes.st_atime_ns, antes.st_mtime_ns))
+    os.replace(temporal, ruta)
+    assert os.stat(ruta).st_size == antes.st_size
+
+    assert plantilla.por_pin("1111") is None
+    assert plantilla.por_pin("9999")["nombre"] == "Ana"
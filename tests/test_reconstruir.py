@@ -0,0 +1,118 @@
+from datetime import date, datetime, timedelta
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+import almacen_registros
+import diario_registros
+import plantilla
+import reconstruir_registros
+from benchmarks.calendario_falso import ServicioFalso
+from conftest import LISTADO
+
+def test_reconstruccion_completa_repetida_no_reescribe_nada(arbol, monkeypatch):
+    monkeypatch.setattr(almacen_registros, "MAX_DIARIO", 10 ** 6)  # Sin compactar, para contar operaciones
+    servicio = ServicioFalso(LISTADO)
+    trabajadores_dict = plantilla.activos_por_nombre()
+    hoy = date(2024, 6, 1)
+
+    reconstruir_registros.reconstruir_completo(servicio, trabajadores_dict, hoy)
+    anotadas = diario_registros.pendientes()
+    reconstruir_registros.reconstruir_completo(servicio, trabajadores_dict, hoy)
+
+    assert anotadas > 0
+    assert diario_registros.pendientes() == anotadas
+
+class ServicioConCambios(ServicioFalso):
+    # Calendario sintético en el que se pueden cancelar y mover eventos; con
+    # syncToken devuelve los cambios, o un 410 si el token ha caducado
+    def __init__(self, listado):
+        super().__init__(listado)
+        self.cambios = {}
+        self.consultas = []
+
+    def cambiar(self, evento):
+        self.cambios[evento["id"]] = evento
+        self._ultima_consulta = (None, [])
+
+    def _eventos(self, desde, hasta):
+        for evento in super()._eventos(desde, hasta):
+            if evento["id"] not in self.cambios:
+                yield evento
+        for evento in self.cambios.values():
+            if evento.get("status") != "cancelled" and desde <= datetime.fromisoformat(evento["start"]["dateTime"]) < hasta:
+                yield evento
+
+    def responder(self, parametros):
+        self.consultas.append(parametros)
+        if parametros.get("syncToken") == "caducado":
+            raise HttpError(httplib2.Response({"status": 410}), b"Gone")
+        if parametros.get("syncToken"):
+            self.peticiones += 1
+            return {"items": list(self.cambios.values()), "nextSyncToken": "siguiente"}
+        return super().responder(parametros)
+
+def _completa(servicio, hoy):
+    return reconstruir_registros.reconstruir_completo(servicio, plantilla.activos_por_nombre(), hoy)
+
+def test_reconstruccion_completa_termina_hoy(arbol):
+    servicio = ServicioConCambios(LISTADO)
+    hoy = date(2024, 6, 1)
+
+    checkpoint = _completa(servicio, hoy)
+
+    assert [c["timeMax"] for c in servicio.consultas] == ["2024-06-02T00:00:00+02:00"]
+    assert checkpoint["ultima_fecha"] == "2024-05-31"
+    assert checkpoint["sync_token"] == "sintetico"
+    assert max(fecha for fecha, _ in checkpoint["eventos"].values()) <= "2024-06-01"
+
+def test_incremental_cancela_mueve_y_solo_toca_los_dias_afectados(arbol):
+    servicio = ServicioConCambios(LISTADO)
+    trabajadores_dict = plantilla.activos_por_nombre()
+    checkpoint = _completa(servicio, date(2024, 6, 1))
+    dias_ana = sorted(f for f, t in checkpoint["eventos"].values() if t == "1" and f.startswith("2024-05"))
+    cancelado, movido, intacto = dias_ana[0], dias_ana[1], dias_ana[2]
+    libre = next(
+        f for f in (date(2024, 5, 1) + timedelta(days=n) for n in range(31))
+        if f.isoformat() not in dias_ana and f.weekday() != 6
+    ).isoformat()
+    # Un registro retocado a mano fuera de los márgenes: si su día se regenerase, cambiaría
+    almacen_registros.guardar_registro({**almacen_registros.leer_registro(intacto, "1"), "entrada": "06:00"})
+    servicio.consultas.clear()
+
+    servicio.cambiar({"id": f"1-{cancelado}", "status": "cancelled"})
+    servicio.cambiar({
+        "id": f"1-{movido}", "summary": "Ana - Turno",
+        "start": {"dateTime": f"{libre}T10:00:00+02:00"}, "end": {"dateTime": f"{libre}T14:00:00+02:00"},
+    })
+    cambios, sync_token = reconstruir_registros.obtener_cambios(servicio, checkpoint["sync_token"])
+    nuevo = reconstruir_registros.reconstruir_incremental(
+        servicio, trabajadores_dict, date(2024, 6, 3), checkpoint, cambios, sync_token
+    )
+
+    assert almacen_registros.leer_registro(cancelado, "1") is None
+    assert almacen_registros.leer_registro(movido, "1") is None
+    assert almacen_registros.leer_registro(libre, "1")["entrada"] in ("09:55", "09:56", "09:57", "09:58", "09:59")
+    assert almacen_registros.leer_registro(intacto, "1")["entrada"] == "06:00"
+    # Solo se vuelven a pedir los días afectados anteriores al punto de control
+    dias_pedidos = {c["timeMin"][:10] for c in servicio.consultas if "timeMin" in c and c["timeMin"] < "2024-06-01"}
+    assert dias_pedidos == {cancelado, movido, libre}
+    assert nuevo["ultima_fecha"] == "2024-06-02"
+    assert nuevo["sync_token"] == "siguiente"
+    assert f"1-{cancelado}" not in nuevo["eventos"]
+    assert nuevo["eventos"][f"1-{movido}"] == [libre, "1"]
+
+def test_token_caducado_hace_una_reconstruccion_completa(arbol, monkeypatch):
+    servicio = ServicioConCambios(LISTADO)
+    monkeypatch.setattr(reconstruir_registros, "obtener_servicio", lambda: servicio)
+    monkeypatch.setattr(reconstruir_registros, "reconstruir_completo", lambda s, t, hoy: {
+        "ultima_fecha": (hoy - timedelta(days=1)).isoformat(), "sync_token": "completo", "eventos": {},
+    })
+    reconstruir_registros.guardar_checkpoint({"ultima_fecha": "2024-05-31", "sync_token": "caducado", "eventos": {}})
+
+    reconstruir_registros.main(incremental=True)
+
+    checkpoint = reconstruir_registros.cargar_checkpoint()
+    assert checkpoint["sync_token"] == "completo"
+    assert checkpoint["ultima_fecha"] == (date.today() - timedelta(days=1)).isoformat()
+    assert [c.get("syncToken") for c in servicio.consultas] == ["caducado"]
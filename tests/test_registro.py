@@ -0,0 +1,26 @@
+import almacen_registros
+from conftest import registro
+from registro import Registro
+
+def test_horas_mal_escritas_se_conservan_tal_cual():
+    guardado = registro(1, "2024-03-01", entrada="25:99", salida="5pm", horas="8,00")
+
+    r = Registro.desde_dict(guardado)
+
+    assert (r.entrada, r.salida, r.horas) == (None, None, None)
+    assert [r.texto(c) for c in ("entrada", "salida", "horas")] == ["25:99", "5pm", "8,00"]
+    assert r.a_dict() == guardado
+
+def test_horas_bien_escritas():
+    r = Registro.desde_dict(registro(1, "2024-03-01", entrada="9:05", salida="23:59", horas="7:30"))
+
+    assert (r.entrada, r.salida, r.horas) == (545, 1439, 7.5)
+    assert [r.texto(c) for c in ("entrada", "salida", "horas")] == ["09:05", "23:59", "7.50"]
+    assert r.otros is None or "entrada" not in r.otros
+
+def test_totales_con_horas_mal_escritas():
+    totales = almacen_registros.calcular_totales([
+        registro(1, "2024-03-01", horas="8,00"), registro(1, "2024-03-02", horas=9.0),
+    ])
+
+    assert totales == {"horas": 9.0, "extras": 1.0, "dias": 2, "sin_salida": 0}
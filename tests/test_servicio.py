@@ -0,0 +1,70 @@
+import http.client
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import almacen_registros
+import cliente_registro
+import servicio_registro
+
+def _no_llamar(**parametros):
+    raise AssertionError("no debía ejecutarse en local")
+
+@pytest.fixture
+def servicio(arbol, monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), servicio_registro._Manejador)
+    servidor.daemon_threads = True
+    monkeypatch.setitem(servicio_registro._token, "valor", servicio_registro._crear_token())
+    monkeypatch.setattr(cliente_registro, "ACTIVO", True)
+    monkeypatch.setattr(cliente_registro, "PUERTO", servidor.server_address[1])
+    monkeypatch.setattr(servicio_registro._Manejador, "log_message", lambda *args: None)
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+def test_fichar_a_traves_del_servicio(servicio):
+    registro = cliente_registro.con_servicio("fichar", _no_llamar, pin="1111", tipo="entrada")
+
+    assert registro["firmado_por_pin"] and registro["id"] == "1"
+    assert almacen_registros.leer_registro(registro["fecha"], "1")["entrada"] == registro["entrada"]
+
+def test_error_de_la_operacion(servicio):
+    with pytest.raises(cliente_registro.ErrorServicio) as e:
+        cliente_registro.con_servicio("fichar", _no_llamar, pin="0000", tipo="entrada")
+    assert e.value.tipo == "ValueError"
+
+def test_sin_servicio_se_ejecuta_en_local(arbol, monkeypatch):
+    with socket.socket() as libre:
+        libre.bind(("127.0.0.1", 0))
+        puerto = libre.getsockname()[1]
+    monkeypatch.setattr(cliente_registro, "ACTIVO", True)
+    monkeypatch.setattr(cliente_registro, "PUERTO", puerto)
+    (arbol / "cache").mkdir()
+    cliente_registro.RUTA_TOKEN.write_text("viejo")  # Token de un servicio que ya no está
+
+    assert cliente_registro.con_servicio("estado", lambda: "local") == "local"
+
+def test_respuesta_lenta_no_se_repite_en_local(servicio, monkeypatch):
+    monkeypatch.setitem(servicio_registro.OPERACIONES, "lenta", (lambda: time.sleep(1), False))
+
+    with pytest.raises(TimeoutError):
+        cliente_registro.con_servicio("lenta", _no_llamar, timeout=0.1)
+
+@pytest.mark.parametrize("cabeceras, codigo", [
+    ({"Content-Type": "application/json"}, 403),
+    ({"Content-Type": "text/plain", "TOKEN": True}, 415),
+    ({"Content-Type": "application/json", "Origin": "http://ejemplo.com", "TOKEN": True}, 403),
+])
+def test_rechaza_peticiones_no_autorizadas(servicio, cabeceras, codigo):
+    if cabeceras.pop("TOKEN", False):
+        cabeceras[cliente_registro.CABECERA_TOKEN] = cliente_registro.leer_token()
+    conexion = http.client.HTTPConnection("127.0.0.1", servicio.server_address[1], timeout=5)
+    conexion.request("POST", "/borrar_rango", b'{"inicio": "2000-01-01", "fin": "2100-01-01"}', cabeceras)
+
+    assert conexion.getresponse().status == codigo
+    conexion.close()
@@ -0,0 +1,90 @@
+from datetime import date
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import sincronizar_calendarios
+
+class Reloj:
+    # Sustituye al módulo time: el tiempo solo avanza con sleep
+    def __init__(self):
+        self.ahora = 0.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        # Como un reloj real, siempre avanza algo (evita bucles por redondeo)
+        self.esperas.append(segundos)
+        self.ahora += max(segundos, 1e-6)
+
+class PeticionFallida:
+    def __init__(self, estados, resultado=None):
+        self.estados = list(estados)
+        self.resultado = resultado
+        self.llamadas = 0
+
+    def execute(self):
+        self.llamadas += 1
+        if self.estados:
+            raise HttpError(httplib2.Response({"status": self.estados.pop(0)}), b"")
+        return self.resultado
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(sincronizar_calendarios, "time", reloj)
+    return reloj
+
+def test_reintenta_429_y_5xx_con_espera_creciente(reloj):
+    peticion = PeticionFallida([429, 503], {"items": []})
+    limitador = sincronizar_calendarios.LimitadorTasa(100)
+
+    resultado = sincronizar_calendarios.ejecutar_con_reintentos(peticion, limitador, espera_base=1.0)
+
+    assert resultado == {"items": []} and peticion.llamadas == 3
+    assert 1 <= reloj.esperas[0] < 2 and 2 <= reloj.esperas[1] < 3
+
+def test_no_reintenta_otros_errores(reloj):
+    peticion = PeticionFallida([404])
+
+    with pytest.raises(HttpError):
+        sincronizar_calendarios.ejecutar_con_reintentos(peticion, sincronizar_calendarios.LimitadorTasa(100))
+    assert peticion.llamadas == 1
+
+def test_se_rinde_tras_los_intentos(reloj):
+    peticion = PeticionFallida([503] * 5)
+
+    with pytest.raises(HttpError):
+        sincronizar_calendarios.ejecutar_con_reintentos(peticion, sincronizar_calendarios.LimitadorTasa(100), intentos=3)
+    assert peticion.llamadas == 3
+
+def test_limitador_respeta_rafaga_y_tasa(reloj):
+    limitador = sincronizar_calendarios.LimitadorTasa(tasa=10, capacidad=2)
+
+    for _ in range(12):
+        limitador.esperar()
+
+    # Dos seguidas sin esperar y las otras diez a 0,1 s cada una
+    assert reloj.ahora == pytest.approx(1.0)
+
+def test_descarga_sigue_con_los_calendarios_que_responden(reloj):
+    evento = {"id": "e1", "summary": "Ana - Mañana", "start": {"dateTime": "2024-03-02T09:00:00+01:00"}}
+
+    class Caido:
+        def events(self):
+            return self
+
+        def list(self, **parametros):
+            if parametros["calendarId"] == "caido":
+                return PeticionFallida([404])
+            return PeticionFallida([], {"items": [evento]})
+
+    resultados, errores = sincronizar_calendarios.descargar_calendarios(
+        ["bueno", "caido"], date(2024, 3, 1), date(2024, 3, 3), crear_servicio=Caido
+    )
+
+    assert resultados == {"bueno": {"2024-03-02": [evento]}}
+    assert set(errores) == {"caido"}
@@ -0,0 +1,60 @@
+import runpy
+import sys
+
+import pytest
+
+import almacen_registros
+from conftest import registro
+
+def _sembrar():
+    # Un registro por cada problema que verificar sabe reparar
+    almacen_registros._escribir_segmento(almacen_registros.ruta_segmento(2024, 3), {
+        "1": [
+            registro(1, "2024-03-01", horas="8:00"),                      # horas_formato
+            registro(1, "2024-03-04", horas=3),                           # horas_incoherentes
+            registro(1, "2024-03-05", salida="", horas=8.0),              # horas_sin_salida (y sin_salida)
+            registro(1, "2024-03-06"),                                    # horas_falta
+            registro(1, "2024-03-07", entrada="10:00", horas=7.0),        # duplicado sin firmar
+            registro(1, "2024-03-07", entrada="08:00", horas=9.0, firmado_por_pin=True,
+                     pin_usado="1111", timestamp_firma="2024-03-07T08:00:00"),
+        ],
+        "2": [registro(2, "2024-03-01", horas=8.0)],
+    })
+
+def _ejecutar(monkeypatch, *argumentos):
+    monkeypatch.setattr(sys, "argv", ["verificar.py", "--procesos", "1", *argumentos])
+    sys.modules.pop("verificar", None)
+    with pytest.raises(SystemExit) as salida:
+        runpy.run_module("verificar", run_name="__main__")
+        raise SystemExit(0)
+    return salida.value.code or 0
+
+def test_reparar_reescribe_el_mes(arbol, monkeypatch):
+    _sembrar()
+    assert _ejecutar(monkeypatch) == 1
+
+    # sin_salida no tiene arreglo seguro: queda pendiente y se sale con error
+    assert _ejecutar(monkeypatch, "--reparar") == 1
+
+    marzo = {r["fecha"]: r for r in almacen_registros.cargar_mes(2024, 3)["1"]}
+    assert marzo["2024-03-01"]["horas"] == 8.0
+    assert marzo["2024-03-04"]["horas"] == 8.0
+    assert "horas" not in marzo["2024-03-05"]
+    assert marzo["2024-03-06"]["horas"] == 8.0
+    assert marzo["2024-03-07"]["entrada"] == "08:00" and marzo["2024-03-07"]["firmado_por_pin"]
+    assert len(almacen_registros.cargar_mes(2024, 3)["1"]) == 5
+    assert almacen_registros.cargar_mes(2024, 3)["2"] == [registro(2, "2024-03-01", horas=8.0)]
+    assert almacen_registros.totales_mes("1", 2024, 3)["horas"] == 33.0
+
+    # Con la salida puesta a mano no queda nada pendiente
+    almacen_registros.guardar_registro({**marzo["2024-03-05"], "salida": "17:00", "horas": 8.0})
+    assert _ejecutar(monkeypatch) == 0
+
+def test_solo_reparables_sale_sin_error(arbol, monkeypatch):
+    almacen_registros._escribir_segmento(almacen_registros.ruta_segmento(2024, 4), {
+        "1": [registro(1, "2024-04-01", horas="8.00"), registro(1, "2024-04-02")],
+    })
+
+    assert _ejecutar(monkeypatch, "--reparar") == 0
+    assert _ejecutar(monkeypatch) == 0
+    assert [r["horas"] for r in almacen_registros.cargar_mes(2024, 4)["1"]] == [8.0, 8.0]